@@ -0,0 +1,104 @@
+"""
+benchmark_crossover.py - Compara o crossover ordenado em lote (nsga.engine.cxOrderedBatch)
+com o cxOrderedVrp: mesmos filhos para os mesmos pontos de corte, mesma distribuição de
+filhos com os pontos sorteados, e mede o tempo dos dois
+
+Uso:
+python benchmark_crossover.py --sizes 100 500 2000 --pairs 200
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+
+import numpy
+
+from nsga.NSGA2 import cxOrderedVrp
+from nsga.engine import cxOrderedBatch
+
+
+def random_parents(pairs, size):
+    parents1 = numpy.array([random.sample(range(1, size + 1), size) for _ in range(pairs)], dtype=numpy.int32)
+    parents2 = numpy.array([random.sample(range(1, size + 1), size) for _ in range(pairs)], dtype=numpy.int32)
+    return parents1, parents2
+
+
+def check_same_cuts(pairs, size):
+    """Os filhos do lote são os do cxOrderedVrp com os mesmos pontos de corte"""
+    parents1, parents2 = random_parents(pairs, size)
+    cuts, expected1, expected2 = [], [], []
+    for ind1, ind2 in zip(parents1.tolist(), parents2.tolist()):
+        # Os pontos que o cxOrderedVrp vai sortear
+        state = random.getstate()
+        cuts.append(sorted(random.sample(range(size), 2)))
+        random.setstate(state)
+        child1, child2 = cxOrderedVrp(ind1, ind2)
+        expected1.append(child1)
+        expected2.append(child2)
+    children1, children2 = cxOrderedBatch(parents1, parents2, numpy.array(cuts))
+    assert numpy.array_equal(children1, expected1) and numpy.array_equal(children2, expected2), \
+        f"filhos diferentes com {size} clientes"
+
+
+def chi_square(counts1, counts2):
+    """Estatística qui-quadrado de homogeneidade de duas amostras e seus graus de liberdade"""
+    categories = sorted(set(counts1) | set(counts2))
+    table = numpy.array([[counts1[c] for c in categories], [counts2[c] for c in categories]], dtype=numpy.float64)
+    expected = table.sum(axis=1, keepdims=True) * table.sum(axis=0, keepdims=True) / table.sum()
+    return float(((table - expected) ** 2 / expected).sum()), len(categories) - 1
+
+
+def check_distribution(size, trials):
+    """Frequência de cada par de filhos de um mesmo par de pais, nos dois operadores"""
+    parents1, parents2 = random_parents(1, size)
+    ind1, ind2 = parents1[0].tolist(), parents2[0].tolist()
+    counts = Counter(tuple(map(tuple, cxOrderedVrp(ind1, ind2))) for _ in range(trials))
+
+    children1, children2 = cxOrderedBatch(numpy.repeat(parents1, trials, axis=0),
+                                          numpy.repeat(parents2, trials, axis=0))
+    batch_counts = Counter(zip(map(tuple, children1.tolist()), map(tuple, children2.tolist())))
+
+    statistic, freedom = chi_square(counts, batch_counts)
+    variation = sum(abs(counts[c] - batch_counts[c]) for c in set(counts) | set(batch_counts)) / (2 * trials)
+    return statistic, freedom, variation
+
+
+def best_time(cross, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cross()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crossover ordenado em lote vs cxOrderedVrp')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 2000])
+    parser.add_argument('--pairs', type=int, default=200)
+    parser.add_argument('--trials', type=int, default=50000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in [2, 3, 8] + args.sizes:
+        check_same_cuts(args.pairs, size)
+    print("Mesmos filhos com os mesmos pontos de corte: ok")
+
+    # Com 6 clientes são 15 pares de pontos de corte
+    statistic, freedom, variation = check_distribution(6, args.trials)
+    print(f"Distribuição dos filhos (6 clientes, {args.trials} cruzamentos): "
+          f"qui-quadrado {statistic:.1f} com {freedom} graus de liberdade, variação total {variation:.4f}")
+
+    print(f"{'N':>6} {'pares':>6} {'cxOrderedVrp (s)':>17} {'lote (s)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        parents1, parents2 = random_parents(args.pairs, size)
+        lists1, lists2 = parents1.tolist(), parents2.tolist()
+        loop_time = best_time(lambda: [cxOrderedVrp(ind1, ind2) for ind1, ind2 in zip(lists1, lists2)],
+                              args.repeats)
+        batch_time = best_time(lambda: cxOrderedBatch(parents1, parents2), args.repeats)
+        print(f"{size:>6} {args.pairs:>6} {loop_time:>17.4f} {batch_time:>10.4f} {loop_time / batch_time:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+benchmark_selection.py - Compara a seleção NSGA-II de dois objetivos (nsga.selection)
+com a tools.selNSGA2 do DEAP: mesmas frentes, mesmas distâncias de crowding e
+mesma seleção, e mede o tempo das duas
+
+Uso:
+python benchmark_selection.py --sizes 200 800 2000 --trials 200
+"""
+
+import argparse
+import random
+import time
+
+import numpy
+from deap import base, creator, tools
+
+from nsga.selection import selNSGA2Bi, nondominatedRanks, crowdingDistances
+
+
+def random_population(size, duplicates=0.1):
+    """População com fitness no formato do VRP (veículos inteiros, custo) e alguns empates"""
+    population = []
+    for _ in range(size):
+        ind = creator.Individual([0])
+        if population and random.random() < duplicates:
+            ind.fitness.values = random.choice(population).fitness.values
+        else:
+            ind.fitness.values = (random.randint(18, 26), round(random.uniform(2400, 4200), random.choice([0, 2])))
+        population.append(ind)
+    return population
+
+
+def check_trial(population, k):
+    """Confere frentes, crowding e seleção contra o DEAP; retorna se a seleção foi idêntica"""
+    objectives = -numpy.array([ind.fitness.wvalues for ind in population])
+    values = numpy.array([ind.fitness.values for ind in population])
+    position = {id(ind): index for index, ind in enumerate(population)}
+
+    ranks = nondominatedRanks(objectives)
+    deap_fronts = tools.sortNondominated(population, len(population))
+    for rank, front in enumerate(deap_fronts):
+        assert all(ranks[position[id(ind)]] == rank for ind in front), "frentes diferentes"
+
+    for rank in range(ranks.max() + 1):
+        front = numpy.flatnonzero(ranks == rank)
+        front_individuals = [population[index] for index in front]
+        tools.emo.assignCrowdingDist(front_individuals)
+        expected = [ind.fitness.crowding_dist for ind in front_individuals]
+        assert numpy.array_equal(crowdingDistances(values, front), expected), "crowding diferente"
+
+    chosen = selNSGA2Bi(population, k)
+    deap_chosen = tools.selNSGA2(population, k)
+    if [id(ind) for ind in chosen] == [id(ind) for ind in deap_chosen]:
+        return True
+
+    # A ordem dentro de uma frente difere do DEAP: só os empates (mesmo fitness
+    # ou mesma distância de crowding no corte da última frente) podem mudar
+    chosen_ranks = sorted(ranks[[position[id(ind)] for ind in chosen]])
+    deap_ranks = sorted(ranks[[position[id(ind)] for ind in deap_chosen]])
+    assert chosen_ranks == deap_ranks, "seleção com frentes diferentes"
+    last_rank = chosen_ranks[-1]
+    tools.emo.assignCrowdingDist([ind for ind in population if ranks[position[id(ind)]] == last_rank])
+    deap_crowding = sorted(ind.fitness.crowding_dist for ind in deap_chosen
+                           if ranks[position[id(ind)]] == last_rank)
+    selNSGA2Bi(population, k)
+    chosen_crowding = sorted(ind.fitness.crowding_dist for ind in chosen if ranks[position[id(ind)]] == last_rank)
+    assert chosen_crowding == deap_crowding, "seleção com crowding diferente"
+    return False
+
+
+def best_time(select, population, k, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        select(population, k)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seleção NSGA-II de dois objetivos vs tools.selNSGA2')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200, 800, 2000])
+    parser.add_argument('--trials', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    if not hasattr(creator, 'FitnessMin'):
+        creator.create('FitnessMin', base.Fitness, weights=(-1.0, -1.0))
+    if not hasattr(creator, 'Individual'):
+        creator.create('Individual', list, fitness=creator.FitnessMin)
+
+    print(f"{'N':>6} {'idênticas':>10} {'empates':>8} {'DEAP (s)':>10} {'bi (s)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        identical = 0
+        for _ in range(args.trials):
+            identical += check_trial(random_population(size), size // 2)
+        population = random_population(size)
+        deap_time = best_time(tools.selNSGA2, population, size // 2, args.repeats)
+        fast_time = best_time(selNSGA2Bi, population, size // 2, args.repeats)
+        print(f"{size:>6} {identical:>10} {args.trials - identical:>8} {deap_time:>10.4f} "
+              f"{fast_time:>10.4f} {deap_time / fast_time:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+benchmark_workers.py - Mede o speedup da avaliação paralela por número de workers
+
+Uso:
+python benchmark_workers.py --instance_name data/json/Input_Data.json --popSize 400 --workers 1 2 4 8
+
+A curva de speedup só aparece numa máquina com vários núcleos: com 1 CPU
+o resultado mede apenas o custo do pool (a tabela do README é desse caso)
+"""
+
+import argparse
+import functools
+import os
+import random
+import time
+
+from nsga.NSGA2 import load_instance, eval_indvidual_fitness, eval_population_fitness
+from nsga.parallel import EvaluationPool, workerEvaluate
+
+
+def time_evaluation(evaluate, population, repeats):
+    """Menor tempo de `repeats` avaliações da população inteira"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        evaluate(population)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Speedup da avaliação por número de workers')
+    parser.add_argument('--instance_name', type=str, default='./data/json/Input_Data.json')
+    parser.add_argument('--popSize', type=int, default=400)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    instance = load_instance(args.instance_name)
+    n = instance['Number_of_customers']
+    population = [random.sample(range(1, n + 1), n) for _ in range(args.popSize)]
+
+    print(f"CPUs: {os.cpu_count()}  |  instância: {args.instance_name}  |  pop: {args.popSize}")
+    if os.cpu_count() == 1:
+        print("Só 1 CPU: os tempos medem o custo do pool, não o speedup")
+    print(f"{'workers':>8} {'map (s)':>10} {'speedup':>8} {'batch (s)':>10} {'speedup':>8}")
+
+    serial_map = time_evaluation(
+        lambda pop: list(map(functools.partial(eval_indvidual_fitness, instance=instance, unit_cost=1), pop)),
+        population, args.repeats)
+    serial_batch = time_evaluation(
+        lambda pop: eval_population_fitness(pop, instance, 1), population, args.repeats)
+    print(f"{'serial':>8} {serial_map:>10.4f} {1.0:>8.2f} {serial_batch:>10.4f} {1.0:>8.2f}")
+
+    for workers in args.workers:
+        with EvaluationPool(instance, workers) as pool:
+            evaluate = functools.partial(workerEvaluate, evaluate=eval_indvidual_fitness, unit_cost=1)
+            evaluate_batch = functools.partial(workerEvaluate, evaluate=eval_population_fitness, unit_cost=1)
+            map_time = time_evaluation(lambda pop: pool.map(evaluate, pop), population, args.repeats)
+            batch_time = time_evaluation(lambda pop: pool.mapBatches(evaluate_batch, pop),
+                                         population, args.repeats)
+        # Mais workers que CPUs só mede o custo do pool, não o paralelismo
+        oversubscribed = "  (> CPUs)" if workers > os.cpu_count() else ""
+        print(f"{workers:>8} {map_time:>10.4f} {serial_map / map_time:>8.2f} "
+              f"{batch_time:>10.4f} {serial_batch / batch_time:>8.2f}{oversubscribed}")
+
+
+if __name__ == '__main__':
+    main()
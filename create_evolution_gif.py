@@ -1,5 +1,4 @@
 import argparse
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
@@ -7,34 +6,7 @@ from pathlib import Path
 from PIL import Image
 import io
 
-
-def parse_csv_row(row):
-    """Parse uma linha do CSV para extrair valores numéricos"""
-    try:
-        # Parse min [num_vehicles, distance]
-        min_str = str(row['min']).strip('[]').split()
-        min_vals = [float(x) for x in min_str if x.strip()]
-        
-        # Parse max
-        max_str = str(row['max']).strip('[]').split()
-        max_vals = [float(x) for x in max_str if x.strip()]
-        
-        # Parse avg
-        avg_str = str(row['avg']).strip('[]').split()
-        avg_vals = [float(x) for x in avg_str if x.strip()]
-        
-        return {
-            'generation': int(row['Generation']),
-            'best_vehicles': min_vals[0] if len(min_vals) > 0 else None,
-            'best_distance': min_vals[1] if len(min_vals) > 1 else None,
-            'max_vehicles': max_vals[0] if len(max_vals) > 0 else None,
-            'max_distance': max_vals[1] if len(max_vals) > 1 else None,
-            'avg_vehicles': avg_vals[0] if len(avg_vals) > 0 else None,
-            'avg_distance': avg_vals[1] if len(avg_vals) > 1 else None,
-        }
-    except Exception as e:
-        print(f"Erro ao parsear linha: {e}")
-        return None
+from nsga.results import loadResultsFrame
 
 
 def create_evolution_frames(csv_file, output_dir):
@@ -44,16 +16,9 @@ def create_evolution_frames(csv_file, output_dir):
     output_path = Path(output_dir)
     output_path.mkdir(parents=True,exist_ok=True)
     
-    # Carregar CSV
+    # Carregar resultados (.npz colunar ou CSV)
     print(f"📊 Carregando dados de {csv_file}...")
-    df = pd.read_csv(csv_file)
-    
-    # Parsear dados
-    data = []
-    for idx, row in df.iterrows():
-        parsed = parse_csv_row(row)
-        if parsed:
-            data.append(parsed)
+    data = loadResultsFrame(csv_file)
     
     print(f"✅ {len(data)} gerações carregadas")
     
@@ -63,18 +28,18 @@ def create_evolution_frames(csv_file, output_dir):
     print(f"🎬 Criando {len(data)//step} frames de animação...")
     
     for idx, i in enumerate(range(0, len(data), step)):
-        gen_data = data[:i+1]  # Até a geração atual
+        gen_data = data.iloc[:i+1]  # Até a geração atual
         
         # Criar figura com 3 subplots
         fig, axes = plt.subplots(1, 3, figsize=(15, 4))
-        fig.suptitle(f'Evolução NSGA-II - Geração {gen_data[-1]["generation"]:.0f}', 
+        fig.suptitle(f'Evolução NSGA-II - Geração {gen_data["Generation"].iloc[-1]:.0f}', 
                     fontsize=14, fontweight='bold')
         
-        generations = [d['generation'] for d in gen_data]
-        vehicles = [d['best_vehicles'] for d in gen_data]
-        distances = [d['best_distance'] for d in gen_data]
-        avg_vehicles = [d['avg_vehicles'] for d in gen_data]
-        avg_distances = [d['avg_distance'] for d in gen_data]
+        generations = gen_data['Generation'].values
+        vehicles = gen_data['Best_Vehicles'].values
+        distances = gen_data['Best_Distance'].values
+        avg_vehicles = gen_data['Avg_Vehicles'].values
+        avg_distances = gen_data['Avg_Distance'].values
         
         # Subplot 1: Convergência de Veículos
         ax1 = axes[0]
@@ -113,8 +78,8 @@ def create_evolution_frames(csv_file, output_dir):
         cbar.set_label('Geração')
         
         # Adicionar texto com estatísticas atuais
-        last = gen_data[-1]
-        stats_text = f"Gen: {last['generation']:.0f} | Veículos: {last['best_vehicles']:.0f} | Distância: {last['best_distance']:.1f} km"
+        last = gen_data.iloc[-1]
+        stats_text = f"Gen: {last['Generation']:.0f} | Veículos: {last['Best_Vehicles']:.0f} | Distância: {last['Best_Distance']:.1f} km"
         fig.text(0.5, 0.02, stats_text, ha='center', fontsize=11, 
                 bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
         
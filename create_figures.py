@@ -9,6 +9,7 @@ from matplotlib.gridspec import GridSpec
 import seaborn as sns
 import os
 from nsga.NSGA2 import load_instance, routeToSubroute, eval_indvidual_fitness
+from nsga.results import loadResultsFrame
 
 
 # Configuração de estilo científico
@@ -28,56 +29,21 @@ class VRPVisualizer:
         Inicializa visualizador e faz parse dos dados
         
         Args:
-            results_csv: Caminho para arquivo CSV com resultados
+            results_csv: Caminho para arquivo CSV (ou .npz) com resultados
         """
-        self.raw_df = pd.read_csv(results_csv)
-        self.results_df = self._parse_results()
+        self.results_df = self._parse_results(results_csv)
         print(f"✅ Dados carregados: {len(self.results_df)} gerações")
     
-    def _parse_results(self) -> pd.DataFrame:
+    def _parse_results(self, results_csv: str) -> pd.DataFrame:
         """
-        Converte formato de string arrays em colunas numéricas
+        Carrega os resultados em colunas numéricas com o leitor comum
+        (nsga.results), que lê o .npz colunar da execução ou, para
+        resultados antigos, converte as colunas do CSV de uma vez
         
-        Entrada: min=[  7.  529.95], max=[  9.  802.48]
-        Saída: colunas separadas para each objetivo
+        Saída: colunas separadas para cada objetivo (Best_Vehicles,
+        Best_Distance, Avg_..., Std_..., Max_...)
         """
-        parsed_data = []
-        
-        for idx, row in self.raw_df.iterrows():
-            try:
-                # Parse min [num_vehicles, distance]
-                min_str = str(row['min']).strip('[]').split()
-                min_vals = [float(x) for x in min_str if x.strip()]
-                
-                # Parse max
-                max_str = str(row['max']).strip('[]').split()
-                max_vals = [float(x) for x in max_str if x.strip()]
-                
-                # Parse avg
-                avg_str = str(row['avg']).strip('[]').split()
-                avg_vals = [float(x) for x in avg_str if x.strip()]
-                
-                # Parse std
-                std_str = str(row['std']).strip('[]').split()
-                std_vals = [float(x) for x in std_str if x.strip()]
-                
-                if len(min_vals) >= 2 and len(max_vals) >= 2:
-                    parsed_data.append({
-                        'Generation': int(row['Generation']),
-                        'Best_Vehicles': min_vals[0],
-                        'Best_Distance': min_vals[1],
-                        'Max_Vehicles': max_vals[0],
-                        'Max_Distance': max_vals[1],
-                        'Avg_Vehicles': avg_vals[0] if len(avg_vals) > 0 else min_vals[0],
-                        'Avg_Distance': avg_vals[1] if len(avg_vals) > 1 else min_vals[1],
-                        'Std_Vehicles': std_vals[0] if len(std_vals) > 0 else 0,
-                        'Std_Distance': std_vals[1] if len(std_vals) > 1 else 0,
-                    })
-            except Exception as e:
-                print(f"⚠️ Erro na linha {idx}: {e}")
-                continue
-        
-        return pd.DataFrame(parsed_data)
+        return loadResultsFrame(results_csv)
 
 
     def fig_1_convergence_analysis(self) -> plt.Figure:
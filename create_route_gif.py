@@ -11,7 +11,6 @@ python create_route_gif.py \
 
 import argparse
 import json
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
@@ -21,6 +20,8 @@ from PIL import Image
 import sys
 import importlib.util
 
+from nsga.results import loadResults, bestSolution
+
 
 def load_instance(instance_json):
     """Carrega instância JSON"""
@@ -44,15 +45,9 @@ def get_functions_from_runAlgorithm():
 
 
 def get_best_solution(csv_file):
-    """Extrai melhor solução do CSV (última geração)"""
-    df = pd.read_csv(csv_file)
-    last_row = df.iloc[-1]
-    
-    # Extrair best_one (representação da solução)
-    best_one_str = str(last_row['best_one']).strip('[]')
-    best_solution = [int(x.strip().strip(',')) for x in best_one_str.split(',') if x.strip()]
-    
-    return best_solution
+    """Extrai melhor solução dos resultados (última geração)"""
+    # best_one (representação da solução) vem como matriz int32
+    return bestSolution(loadResults(csv_file))
 
 
 def create_route_animation_frames(instance, best_solution, funcs, 
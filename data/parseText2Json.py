@@ -1,4 +1,4 @@
-from nsga_vrp.utils import converttext2json
+from nsga.utils import converttext2json
 
 def main():
     converttext2json()
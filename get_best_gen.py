@@ -4,6 +4,8 @@ import pandas as pd
 import time
 from tqdm import tqdm
 
+from nsga.results import loadResults, OBJECTIVES
+
 NUM_GEN_LIST = [100, 200, 300, 400, 500]
 INSTANCE_NAME = "Input_Data"
 
@@ -48,16 +50,12 @@ for config in tests_configs:
             continue
 
         try:
-            df = pd.read_csv(filepath)
-            if df.empty: continue
-
-            last_gen = df.iloc[-1]
+            results = loadResults(filepath)
+            if not len(results['Generation']): continue
 
-            val_str = str(last_gen['min']).replace('[', '').replace(']', '')
-            parts = val_str.replace(',', ' ').split()
-            
-            best_vehicles = float(parts[0])
-            best_cost = float(parts[1])
+            # Por nome do objetivo: com janelas de tempo há um terceiro (Lateness)
+            best = dict(zip(OBJECTIVES, results['min'][-1].tolist()))
+            best_vehicles, best_cost = best['Vehicles'], best['Distance']
             
             summary_data.append({
                 'Config_ID': config_id,
@@ -0,0 +1,80 @@
+"""
+job_server.py - Servidor local de execuções do NSGA-II (nsga.server.JobServer) e cliente
+
+Uso:
+python job_server.py serve --port 8765 --workers 2
+python job_server.py serve --socket /tmp/nsga.sock
+python job_server.py submit --instance_name ./data/json/Input_Data.json --popSize 100 --numGen 50 \
+    --priority 0 --option engine=array
+"""
+
+import argparse
+import asyncio
+import json
+
+from nsga.server import JobServer, submitJob
+
+
+def parse_options(options):
+    """Opções chave=valor do nsgaAlgo, o valor lido como JSON quando possível (números, true/false)"""
+    parsed = {}
+    for option in options:
+        key, value = option.split('=', 1)
+        try:
+            parsed[key] = json.loads(value)
+        except ValueError:
+            parsed[key] = value
+    return parsed
+
+
+async def submit(args):
+    config = {'pop': args.popSize, 'cross': args.crossProb, 'mut': args.mutProb, 'gen': args.numGen,
+              'options': parse_options(args.option)}
+    if args.seed is not None:
+        config['seed'] = args.seed
+    async for message in submitJob(args.instance_name, config, args.priority, args.host, args.port, args.socket):
+        if message['type'] == 'accepted':
+            print(f"job {message['job']} aceito ({message['queued']} na fila)")
+        elif message['type'] == 'progress':
+            print(f"job {message['job']} geração {message['generation']}: melhor {message['min']}")
+        elif message['type'] == 'done':
+            print(f"job {message['job']} concluído em {message['execution_time_s']} s "
+                  f"(instância em cache: {message['instance_cached']}, parada: {message['stop_reason']}): "
+                  f"fitness {message['fitness']}")
+            print(f"resultados em results/{message['results']}.csv")
+        else:
+            print(f"erro: {message['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor de execuções do NSGA-II')
+    parser.add_argument('command', choices=['serve', 'submit'])
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', type=str, default=None, help="Socket unix em vez de TCP")
+    parser.add_argument('--workers', type=int, default=2, help="Execuções simultâneas (processos)")
+    parser.add_argument('--maxQueued', type=int, default=100, help="Máximo de jobs esperando na fila")
+    parser.add_argument('--instanceCache', type=int, default=4, help="Instâncias mantidas em cada processo")
+    parser.add_argument('--instance_name', type=str, default="./data/json/Input_Data.json")
+    parser.add_argument('--popSize', type=int, default=400)
+    parser.add_argument('--crossProb', type=float, default=0.85)
+    parser.add_argument('--mutProb', type=float, default=0.02)
+    parser.add_argument('--numGen', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=None, help="Semente da execução (padrão: uma nova por job)")
+    parser.add_argument('--priority', type=int, default=0, help="Menor valor roda antes")
+    parser.add_argument('--option', type=str, action='append', default=[],
+                        help="Atributo do nsgaAlgo como chave=valor (ex.: engine=array, batch_eval=true)")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        server = JobServer(args.workers, args.maxQueued, args.instanceCache)
+        try:
+            asyncio.run(server.serve(args.host, args.port, args.socket))
+        except KeyboardInterrupt:
+            print("servidor encerrado")
+    else:
+        asyncio.run(submit(args))
+
+
+if __name__ == '__main__':
+    main()
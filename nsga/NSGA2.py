@@ -6,40 +6,73 @@ import numpy
 import fnmatch
 import csv
 import array
+import bisect
+import functools
 
+from collections import namedtuple
 from csv import DictWriter
 from json import load, dump
 from deap import base, creator, tools, algorithms, benchmarks
 from deap.benchmarks.tools import diversity, convergence, hypervolume
 
+from nsga.instance import compileInstance, loadCachedInstance, loadBinaryInstance
+from nsga.parallel import EvaluationPool, workerEvaluate
+from nsga.results import exportResults, ResultsWriter
+from nsga.checkpoint import saveCheckpoint, loadCheckpoint, restorePopulation, setRandomState
+from nsga.selection import selNSGA2Bi, selectNSGA2Indices
+from nsga.cache import FitnessCache
+from nsga.diversity import replaceDuplicates, positionDiversity
+from nsga.split import eval_split_fitness, eval_population_split_fitness, splitSubroutes
+from nsga.timewindows import eval_time_window_fitness, eval_population_time_window_fitness, timeWindowSubroutes
+from nsga.engine import selTournamentDCDIndices, cxOrderedBatch, mutationShuffleBatch
+from nsga.seeding import seedRoutes
+from nsga.termination import StoppingCriteria
+
 
 BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
-def load_instance(json_file):
+def load_instance(json_file, use_cache=True, distance_mode='matrix', cache_rows=16):
     """
-    Inputs: path to json file
-    Outputs: json file object if it exists, or else returns NoneType
+    Inputs: path to json file (or to the .npz of a binary instance written
+            by nsga/utils.py)
+            use_cache - read/write the binary cache kept alongside the json
+            distance_mode - 'matrix' keeps the full distance matrix, 'lazy'
+                            keeps only the coordinates and computes distances
+                            on demand (for very large instances)
+            cache_rows - rows kept in the LRU cache of the lazy mode
+    Outputs: json file object compiled in to a VrpInstance if it exists,
+             or else returns NoneType
     """
     if os.path.exists(path=json_file):
+        if json_file.endswith('.npz'):
+            return loadBinaryInstance(json_file, distance_mode=distance_mode, cache_rows=cache_rows)
+        if use_cache:
+            return loadCachedInstance(json_file, distance_mode, cache_rows)
         with io.open(json_file, 'rt', newline='') as file_object:
-            return load(file_object)
+            return compileInstance(load(file_object), distance_mode, cache_rows)
     return None
 
-def routeToSubroute(individual, instance):
+def routeToSubroute(individual, instance, decoder='greedy'):
     """
     Inputs: Sequence of customers that a route has
             Loaded instance problem
+            decoder - 'greedy', the optimal 'split' / 'fleet' of nsga.split
+                      or the 'timewindows' split of nsga.timewindows
     Outputs: Route that is divided in to subroutes
              which is assigned to each vechicle.
     """
+    if decoder == 'timewindows':
+        return timeWindowSubroutes(individual, instance)
+    if decoder != 'greedy':
+        return splitSubroutes(individual, instance, fleet=decoder == 'fleet')
+    instance = compileInstance(instance)
     route = []
     sub_route = []
     vehicle_load = 0
-    last_customer_id = 0
-    vehicle_capacity = instance['vehicle_capacity']
-    
-    for customer_id in individual:
-        demand = instance[f"customer_{customer_id}"]["demand"]
+    vehicle_capacity = instance.capacity
+    demands = instance.demand[numpy.asarray(individual)].tolist()
+
+    for customer_id, demand in zip(individual, demands):
         updated_vehicle_load = vehicle_load + demand
 
         if(updated_vehicle_load <= vehicle_capacity):
@@ -49,8 +82,6 @@ def routeToSubroute(individual, instance):
             route.append(sub_route)
             sub_route = [customer_id]
             vehicle_load = demand
-        
-        last_customer_id = customer_id
 
     if sub_route != []:
         route.append(sub_route)
@@ -95,41 +126,254 @@ def getRouteCost(individual, instance, unit_cost=1):
     Outputs:
         - Total cost for the route taken by all the vehicles
     """
-    total_cost = 0
+    instance = compileInstance(instance)
     updated_route = routeToSubroute(individual, instance)
 
+    # Whole tour with the depot between subroutes: 0 - a - b - 0 - c - 0
+    tour = [0]
     for sub_route in updated_route:
-        sub_route_distance = 0
-        last_customer_id = 0
+        tour.extend(sub_route)
+        tour.append(0)
+    tour = numpy.asarray(tour)
 
-        for customer_id in sub_route:
-            distance = instance["distance_matrix"][last_customer_id][customer_id]
-            sub_route_distance += distance
-            last_customer_id = customer_id
+    total_distance = instance.distance_matrix[tour[:-1], tour[1:]].sum()
+    return unit_cost * float(total_distance)
 
-        sub_route_distance = sub_route_distance + instance["distance_matrix"][last_customer_id][0]
 
-        sub_route_transport_cost = unit_cost*sub_route_distance
+def eval_indvidual_fitness(individual, instance, unit_cost, decoder='greedy'):
+    """
+    Inputs: individual route as a sequence
+            Json object that is loaded as file object
+            unit_cost for the distance 
+            decoder - 'greedy' split of routeToSubroute, the optimal
+                      'split' / 'fleet' of nsga.split or 'timewindows',
+                      which adds the Lateness to the tuple (nsga.timewindows)
+    Outputs: Returns a tuple of (Number of vechicles, Route cost from all the vechicles)
 
-        total_cost = total_cost + sub_route_transport_cost
-    
-    return total_cost
+    The permutation is walked once: the loop only accumulates the load to
+    find where a new vehicle starts, the subroutes are never built (use
+    routeToSubroute for reporting) and the cost is summed with numpy.
+    """
+    if decoder == 'timewindows':
+        return eval_time_window_fitness(individual, instance, unit_cost)
+    if decoder != 'greedy':
+        return eval_split_fitness(individual, instance, unit_cost, fleet=decoder == 'fleet')
+    instance = compileInstance(instance)
+    stops = numpy.asarray(individual)
+    distance_matrix = instance.distance_matrix
+    vehicle_capacity = instance.capacity
+
+    new_vehicle = numpy.zeros(len(stops), dtype=bool)
+    vehicle_load = 0
+    for position, demand in enumerate(instance.demand[stops].tolist()):
+        vehicle_load += demand
+        if vehicle_load > vehicle_capacity:
+            new_vehicle[position] = True
+            vehicle_load = demand
+
+    # Each step either follows the edge or returns to the depot and leaves again
+    step_cost = numpy.where(new_vehicle[1:],
+                            distance_matrix[stops[:-1], 0] + distance_matrix[0, stops[1:]],
+                            distance_matrix[stops[:-1], stops[1:]])
+    route_cost = distance_matrix[0, stops[0]] + step_cost.sum() + distance_matrix[stops[-1], 0]
+
+    vehicles = int(new_vehicle.sum()) + 1
+    return (vehicles, unit_cost * float(route_cost))
+
+
+def eval_population_fitness(individuals, instance, unit_cost, decoder='greedy'):
+    """
+    Inputs: sequence of individuals (or a 2-D permutation array, one row each)
+            Json object that is loaded as file object
+            unit_cost for the distance
+            decoder - see eval_indvidual_fitness
+    Outputs: Returns a list with the (Number of vechicles, Route cost) tuple
+             of every individual, the same values eval_indvidual_fitness gives.
+
+    The greedy split is walked once over the customer positions and every
+    step is vectorized over the whole population, the edges are gathered
+    from the distance matrix in a single indexing for all individuals.
+    """
+    if decoder == 'timewindows':
+        return eval_population_time_window_fitness(individuals, instance, unit_cost)
+    if decoder != 'greedy':
+        return eval_population_split_fitness(individuals, instance, unit_cost, fleet=decoder == 'fleet')
+    if len(individuals) == 0:
+        return []
+    instance = compileInstance(instance)
+    perms = numpy.asarray(individuals, dtype=numpy.intp)
+    distance_matrix = instance.distance_matrix
+    capacity = instance.capacity
+
+    demands = instance.demand[perms]
+    from_depot = distance_matrix[0, perms]
+    to_depot = distance_matrix[perms, 0]
+    edges = distance_matrix[perms[:, :-1], perms[:, 1:]]
+
+    vehicle_load = demands[:, 0].copy()
+    vehicles = numpy.ones(len(perms), dtype=numpy.int64)
+    route_cost = from_depot[:, 0].copy()
+
+    for position in range(1, perms.shape[1]):
+        vehicle_load += demands[:, position]
+        new_vehicle = vehicle_load > capacity
+        vehicle_load[new_vehicle] = demands[new_vehicle, position]
+        vehicles += new_vehicle
+        route_cost += numpy.where(new_vehicle,
+                                  to_depot[:, position - 1] + from_depot[:, position],
+                                  edges[:, position - 1])
+
+    route_cost += to_depot[:, -1]
+    route_cost *= unit_cost
+
+    return list(zip(vehicles.tolist(), route_cost.tolist()))
+
+
+class SplitState(namedtuple('SplitState', ('cumulative_demand', 'depot_cost', 'edge_cost', 'new_vehicle'))):
+    """
+    Split state of an individual, see eval_split_state. Its arrays are
+    never changed once built (eval_incremental_fitness works on copies), so
+    the clones of the individual share them instead of copying them.
+    """
+    __slots__ = ()
+
+    def __deepcopy__(self, memo):
+        return self
 
 
-def eval_indvidual_fitness(individual, instance, unit_cost):
+def eval_split_state(individual, instance, unit_cost):
     """
     Inputs: individual route as a sequence
             Json object that is loaded as file object
-            unit_cost for the distance 
-    Outputs: Returns a tuple of (Number of vechicles, Route cost from all the vechicles)
+            unit_cost for the distance
+    Outputs: Returns a tuple of (fitness, split state). The fitness is the
+             (Number of vechicles, Route cost) tuple of eval_indvidual_fitness
+             and the split state the SplitState of the positions: demand
+             served up to each stop, cost of reaching the stop through the
+             depot and straight from the stop before, and whether it starts
+             a new vehicle. eval_incremental_fitness reuses the state of a
+             parent to evaluate its mutated children. The cumulative demand
+             is None, and the children are evaluated from scratch, without
+             the instance's whole_demand (the sums would not be exact).
     """
+    instance = compileInstance(instance)
+    stops = numpy.asarray(individual)
+    distance_matrix = instance.distance_matrix
+    vehicle_capacity = instance.capacity
+    demands = instance.demand[stops]
+
+    new_vehicle = numpy.zeros(len(stops), dtype=bool)
+    vehicle_load = 0
+    for position, demand in enumerate(demands.tolist()):
+        vehicle_load += demand
+        if vehicle_load > vehicle_capacity:
+            new_vehicle[position] = True
+            vehicle_load = demand
+
+    # The first stop is reached from the depot either way
+    depot_cost = numpy.empty(len(stops), dtype=numpy.float64)
+    edge_cost = numpy.empty(len(stops), dtype=numpy.float64)
+    depot_cost[0] = edge_cost[0] = distance_matrix[0, stops[0]]
+    depot_cost[1:] = distance_matrix[stops[:-1], 0] + distance_matrix[0, stops[1:]]
+    edge_cost[1:] = distance_matrix[stops[:-1], stops[1:]]
+
+    cumulative_demand = numpy.cumsum(demands) if instance.whole_demand else None
+    split_state = SplitState(cumulative_demand, depot_cost, edge_cost, new_vehicle)
+    return splitStateFitness(individual, split_state, instance, unit_cost), split_state
 
-    vehicles = getNumVehiclesRequired(individual, instance)
 
-    route_cost = getRouteCost(individual, instance, unit_cost)
+def splitStateFitness(individual, split_state, instance, unit_cost):
+    """
+    Inputs: individual route, its split state, instance and unit cost
+    Outputs: (Number of vechicles, Route cost) tuple read from the split state
+    """
+    _, depot_cost, edge_cost, new_vehicle = split_state
+    step_cost = numpy.where(new_vehicle, depot_cost, edge_cost)
+    # Summed in the order of eval_indvidual_fitness, so both give the same bits
+    route_cost = step_cost[0] + step_cost[1:].sum() + instance.distance_matrix[individual[-1], 0]
+    return (1 + int(numpy.count_nonzero(new_vehicle)), unit_cost * float(route_cost))
+
 
-    return (vehicles, route_cost)
+def eval_incremental_fitness(individual, instance, unit_cost, parent_state, changed_positions):
+    """
+    Inputs: individual route as a sequence
+            Json object that is loaded as file object
+            unit_cost for the distance
+            parent_state - split state (eval_split_state) of the parent
+            changed_positions - positions where the individual differs from
+                                the parent (e.g. the swaps of a mutation)
+    Outputs: Returns a tuple of (fitness, split state), the same values
+             eval_split_state gives.
+
+    The greedy split starts a vehicle at the first stop whose demand,
+    counted from the start of the route, goes over the capacity, so each
+    route end is a binary search of the cumulative demand. The child's
+    cumulative demand is the parent's outside the changed positions, and
+    its routes are searched one at a time from the route before the first
+    changed position until one starts at the same stop as a route of the
+    parent past the last changed position: from there on the routes are
+    the parent's. Only the steps into and out of the changed stops get new
+    costs, the vehicle starts pick between the two costs of each step.
+    """
+    if not len(changed_positions):
+        return splitStateFitness(individual, parent_state, instance, unit_cost), parent_state
+    parent_cumulative, parent_depot_cost, parent_edge_cost, parent_new_vehicle = parent_state
+    if parent_cumulative is None:
+        return eval_split_state(individual, instance, unit_cost)
 
+    instance = compileInstance(instance)
+    size = len(individual)
+    changed = sorted(set(changed_positions))
+    first, last = changed[0], changed[-1]
+
+    # The changed stops are the parent's in another order: between two
+    # changed positions the cumulative demand is the parent's shifted by
+    # the demands changed so far (the parent's demand at a position is the
+    # step of its cumulative demand), and from the last one it is the same
+    cumulative = parent_cumulative.copy()
+    shift = 0.0
+    for position, next_position in zip(changed, changed[1:] + [last + 1]):
+        parent_demand = parent_cumulative[position] - (parent_cumulative[position - 1] if position else 0.0)
+        shift += instance.demand[individual[position]] - parent_demand
+        cumulative[position:next_position] += shift
+    # bisect searches an array.array faster than a numpy array
+    walk_cumulative = array.array('d', cumulative.tobytes())
+
+    # The vehicles before the first changed position stay, the one serving
+    # the stop before it may now go further
+    route_start = max(first - 1, 0)
+    while route_start and not parent_new_vehicle[route_start]:
+        route_start -= 1
+    first_start = route_start
+    new_starts = []
+    while True:
+        served = walk_cumulative[route_start - 1] if route_start else 0.0
+        route_start = bisect.bisect_right(walk_cumulative, served + instance.capacity, route_start)
+        if route_start >= size or (route_start > last and parent_new_vehicle[route_start]):
+            break
+        new_starts.append(route_start)
+
+    new_vehicle = parent_new_vehicle.copy()
+    new_vehicle[first_start + 1:route_start] = False
+    new_vehicle[new_starts] = True
+
+    # Steps into and out of the changed stops, their three distances read
+    # from the matrix at once
+    positions = sorted(set(changed).union(position + 1 for position in changed if position + 1 < size))
+    current_stops = [individual[position] for position in positions]
+    previous_stops = [individual[position - 1] if position else 0 for position in positions]
+    depot = [0] * len(positions)
+    distances = instance.distance_matrix[numpy.array(previous_stops + depot + previous_stops, dtype=numpy.intp),
+                                         numpy.array(depot + current_stops + current_stops, dtype=numpy.intp)]
+    to_depot, from_depot, edges = distances.reshape(3, len(positions))
+    depot_cost, edge_cost = parent_depot_cost.copy(), parent_edge_cost.copy()
+    depot_cost[positions] = to_depot + from_depot
+    edge_cost[positions] = edges
+    if positions[0] == 0:
+        depot_cost[0] = edge_cost[0]
+
+    split_state = SplitState(cumulative, depot_cost, edge_cost, new_vehicle)
+    return splitStateFitness(individual, split_state, instance, unit_cost), split_state
 
 
 def cxOrderedVrp(input_ind1, input_ind2):
@@ -183,6 +427,55 @@ def mutationShuffle(individual, indpb):
     return individual,
 
 
+def mutationShuffleChanges(individual, indpb):
+    """
+    Inputs : Individual route
+             Probability of mutation betwen (0,1)
+    Outputs: sorted list of the positions whose customer changed, the
+             individual is mutated in place with the same random draws as
+             mutationShuffle (swaps undone by later ones are not listed)
+    """
+    size = len(individual)
+    original = {}
+    for i in range(size):
+        if random.random() < indpb:
+            swap_indx = random.randint(0, size - 2)
+            if swap_indx >= i:
+                swap_indx += 1
+            original.setdefault(i, individual[i])
+            original.setdefault(swap_indx, individual[swap_indx])
+            individual[i], individual[swap_indx] = \
+                individual[swap_indx], individual[i]
+
+    return sorted(position for position, stop in original.items() if individual[position] != stop)
+
+
+# creator classes of each number of objectives: (Number of vehicles, Route
+# cost) and, with the time windows, (Number of vehicles, Route cost, Lateness)
+CREATOR_CLASSES = {2: ('FitnessMin', 'Individual'), 3: ('FitnessMinTW', 'IndividualTW')}
+
+
+def creatorClasses(num_objectives):
+    """
+    Inputs : number of objectives
+    Outputs: tuple of the creator fitness class (all the objectives are
+             minimized) and individual class, created the first time
+    """
+    fitness_name, individual_name = CREATOR_CLASSES[num_objectives]
+    if not hasattr(creator, fitness_name):
+        creator.create(fitness_name, base.Fitness, weights=(-1.0,) * num_objectives)
+    if not hasattr(creator, individual_name):
+        creator.create(individual_name, list, fitness=getattr(creator, fitness_name))
+    return getattr(creator, fitness_name), getattr(creator, individual_name)
+
+
+LOGBOOK_HEADER = ("Generation", "evals", "avg", "std", "min", "max", "best_one", "fitness_best_one")
+# Columns added to the records by the fitness cache
+CACHE_COLUMNS = ("cache_hits", "cache_misses", "cache_hit_rate")
+# Columns added by the duplicate elimination
+DEDUP_COLUMNS = ("duplicates", "diversity")
+
+
 def createStatsObjs():
     """
     Inputs : None
@@ -195,24 +488,67 @@ def createStatsObjs():
     stats.register("max", numpy.max, axis=0)
 
     logbook = tools.Logbook()
-    logbook.header = "Generation", "evals", "avg", "std", "min", "max", "best_one", "fitness_best_one"
+    logbook.header = LOGBOOK_HEADER
     return logbook, stats
 
 
-def recordStat(invalid_ind, logbook, pop, stats, gen):
+def recordStat(invalid_ind, logbook, pop, stats, gen, sink=None, history=None, extra=None):
     """
     Inputs : invalid_ind - Number of children for which fitness is calculated
              logbook - Logbook object that logs data
              pop - population
              stats - stats object that compiles statistics
+             sink - ResultsWriter the record is also written to
+             history - number of generations kept in the logbook when they
+                       are written to sink, all if None
+             extra - dict of more columns of the record (cache counters)
     Outputs: None, prints the logs
     """
     record = stats.compile(pop)
     best_individual = tools.selBest(pop, 1)[0]
     record["best_one"] = best_individual
     record["fitness_best_one"] = best_individual.fitness
-    logbook.record(Generation=gen, evals=len(invalid_ind), **record)
+    logbook.record(Generation=gen, evals=len(invalid_ind), **record, **(extra or {}))
     print(logbook.stream)
+    _keepRecord(logbook, sink, history)
+
+
+def recordArrayStat(evals, logbook, pop, fitness, gen, sink=None, history=None, extra=None):
+    """
+    Inputs : evals - Number of children for which fitness is calculated
+             logbook - Logbook object that logs data
+             pop - 2d array of the routes of the population (array engine)
+             fitness - 2d array of their fitness values
+             sink - ResultsWriter the record is also written to
+             history - number of generations kept in the logbook when they
+                       are written to sink, all if None
+             extra - dict of more columns of the record (cache counters)
+    Outputs: None, prints the logs; the record is the one recordStat writes
+             for the same population
+    """
+    record = {"avg": fitness.mean(axis=0), "std": fitness.std(axis=0),
+              "min": fitness.min(axis=0), "max": fitness.max(axis=0)}
+    # First row with the lowest fitness, as tools.selBest picks it
+    best = numpy.lexsort(fitness.T[::-1])[0]
+    record["best_one"] = pop[best].tolist()
+    fitness_class, _ = creatorClasses(fitness.shape[1])
+    record["fitness_best_one"] = fitness_class(tuple(fitness[best].tolist()))
+    logbook.record(Generation=gen, evals=evals, **record, **(extra or {}))
+    print(logbook.stream)
+    _keepRecord(logbook, sink, history)
+
+
+def _keepRecord(logbook, sink, history):
+    # Without a sink the logbook is the only copy of the run, doExport
+    # writes it whole, so nothing is dropped
+    if sink is None:
+        return
+    sink.write(logbook[-1])
+    if history is not None and len(logbook) > history:
+        while len(logbook) > history:
+            logbook.pop(0)
+        # Only the new records are streamed, without printing the header again
+        logbook.buffindex = len(logbook)
 
 
 
@@ -231,50 +567,293 @@ def exportCsv(csv_file_name, logbook):
 
 class nsgaAlgo(object):
 
-    def __init__(self):
-        self.json_instance = load_instance('./data/json/Input_Data.json')
+    def __init__(self, json_file='./data/json/Input_Data.json', distance_mode='matrix', cache_rows=16,
+                 instance=None):
+        # An already loaded instance (grid search workers) skips the loading
+        if instance is None:
+            instance = load_instance(json_file, distance_mode=distance_mode, cache_rows=cache_rows)
+        self.json_instance = instance
         self.ind_size = self.json_instance['Number_of_customers']
         self.pop_size = 400
         self.cross_prob = 0.85
         self.mut_prob = 0.02
         self.num_gen = 150
+        self.batch_eval = False
+        self.incremental_eval = False
+        # Split of the permutation into routes, see nsga.split.DECODERS
+        self.decoder = 'greedy'
+        # 'deap' evolves a list of creator.Individual, 'array' the rows of an
+        # int32 matrix with a parallel fitness matrix (see runArrayGenerations)
+        self.engine = 'deap'
+        self.workers = 1
+        self.pool = None
+        # Routes kept by the fitness cache (0 disables it)
+        self.cache_size = 0
+        self.fitness_cache = None
+        # Duplicate routes of parents and offspring replaced before the
+        # selection: 'none', 'perturb' (segment reversal) or 'random'
+        self.dedup = 'none'
+        self.duplicates = 0
+        # Sources of the routes the initial population is seeded with (see
+        # nsga.seeding.seedRoutes), at most seed_ratio of the population
+        self.seeding = ()
+        self.seed_ratio = 0.25
+        # Early stopping (see nsga.termination.StoppingCriteria): window of
+        # generations without improvement of the stagnation metric, wall
+        # clock budget in seconds and evaluation budget, 0 disables each
+        self.stagnation_window = 0
+        self.stagnation_metric = 'best'
+        self.stagnation_tolerance = 0.0
+        self.time_budget = 0
+        self.eval_budget = 0
+        self.stopping = None
+        self.stop_reason = None
+        # Generations kept in the logbook when the whole run is in
+        # results_writer (without it the logbook keeps every generation)
+        self.history_size = 100
+        self.results_writer = None
+        # Checkpoint every checkpoint_every generations (0 disables it), with
+        # resume runMain continues from the checkpoint if there is one
+        self.checkpoint_every = 0
+        self.resume = False
+        self.start_gen = 0
         self.toolbox = base.Toolbox()
         self.logbook, self.stats = createStatsObjs()
         self.createCreators()
 
     def createCreators(self):
-        creator.create('FitnessMin', base.Fitness, weights=(-1.0, -1.0))
-        creator.create('Individual', list, fitness=creator.FitnessMin)
+        creatorClasses(2)
+
+        self.registerOperators()
+
+    def registerOperators(self):
+        """
+        Registers the operators in the toolbox, reading the instance and the
+        parameters from the object, so it is called again by runMain after
+        the attributes were changed (runAlgorithm.py does that).
+        """
+        self.ind_size = self.json_instance['Number_of_customers']
 
         self.toolbox.register('indexes', random.sample, range(1, self.ind_size + 1), self.ind_size)
 
-        self.toolbox.register('individual', tools.initIterate, creator.Individual, self.toolbox.indexes)
+        _, self.individual_class = creatorClasses(self.numObjectives())
+        self.toolbox.register('individual', tools.initIterate, self.individual_class, self.toolbox.indexes)
         self.toolbox.register('population', tools.initRepeat, list, self.toolbox.individual)
 
-        self.toolbox.register('evaluate', eval_indvidual_fitness, instance=self.json_instance, unit_cost=1)
-
-        self.toolbox.register("select", tools.selNSGA2)
+        if self.workers > 1:
+            self.startPool()
+        else:
+            self.closePool()
+            self.toolbox.register('map', map)
+            self.toolbox.register('evaluate', eval_indvidual_fitness, instance=self.json_instance, unit_cost=1,
+                                  decoder=self.decoder)
+            self.toolbox.register('evaluate_batch', eval_population_fitness, instance=self.json_instance, unit_cost=1,
+                                  decoder=self.decoder)
+            self.toolbox.register('evaluate_state', eval_split_state, instance=self.json_instance, unit_cost=1)
+            self.toolbox.register('evaluate_incremental', eval_incremental_fitness,
+                                  instance=self.json_instance, unit_cost=1)
+
+        self.fitness_cache = FitnessCache(self.cache_size) if self.cache_size else None
+        self.logbook.header = LOGBOOK_HEADER + (CACHE_COLUMNS if self.fitness_cache is not None else ()) \
+                              + (DEDUP_COLUMNS if self.dedup != 'none' else ())
+
+        # Same selection as tools.selNSGA2, with the two-objective sort
+        self.toolbox.register("select", selNSGA2Bi)
 
         self.toolbox.register("mate", cxOrderedVrp)
+        # Whole mating batch of the array engine at once
+        self.toolbox.register("mate_batch", cxOrderedBatch)
 
         self.toolbox.register("mutate", mutationShuffle, indpb=self.mut_prob)
+        # Same mutation, giving the changed positions to the incremental evaluation
+        self.toolbox.register("mutate_changes", mutationShuffleChanges, indpb=self.mut_prob)
+        self.toolbox.register("mutate_batch", mutationShuffleBatch, indpb=self.mut_prob)
+
+
+    def numObjectives(self):
+        """
+        Outputs: 3 with the time windows decoder (the Lateness is added), 2
+        """
+        return 3 if self.decoder == 'timewindows' else 2
+
+    def startPool(self):
+        """
+        Starts the evaluation process pool with the instance shipped once to
+        each worker, and points toolbox.map, evaluate and evaluate_batch to it.
+        """
+        self.closePool()
+        self.pool = EvaluationPool(self.json_instance, self.workers)
+
+        self.toolbox.register('map', self.pool.map)
+        self.toolbox.register('evaluate', workerEvaluate, evaluate=eval_indvidual_fitness, unit_cost=1,
+                              decoder=self.decoder)
+        self.toolbox.register('evaluate_batch', self.pool.mapBatches,
+                              functools.partial(workerEvaluate, evaluate=eval_population_fitness, unit_cost=1,
+                                                decoder=self.decoder))
+
+    def extraRecord(self):
+        """
+        Outputs: columns of the record of this generation added by the
+                 fitness cache and by the duplicate elimination, None
+                 without both
+        """
+        extra = {}
+        if self.fitness_cache is not None:
+            extra.update(self.fitness_cache.generationRecord())
+        if self.dedup != 'none':
+            extra['duplicates'] = self.duplicates
+            extra['diversity'] = round(positionDiversity(numpy.asarray(self.pop, dtype=numpy.int32)), 4)
+        return extra or None
+
+    def duplicateReplacement(self):
+        """
+        Outputs: fresh argument of replaceDuplicates for the dedup mode,
+                 new random routes or None (perturbed copies)
+        """
+        return self.toolbox.indexes if self.dedup == 'random' else None
+
+    def replaceDuplicateIndividuals(self, individuals):
+        """
+        Inputs : individuals, parents first, then the offspring
+        Outputs: list of the individuals replaced (see replaceDuplicates),
+                 already evaluated
+        """
+        replaced = [individuals[index] for index in replaceDuplicates(individuals, self.duplicateReplacement())]
+        for ind in replaced:
+            if ind.fitness.valid:
+                del ind.fitness.values
+            # Not a mutation of the parent the split state came from
+            ind.changed_positions = None
+        self.evaluateIndividuals(replaced)
+        self.duplicates = len(replaced)
+        return replaced
+
+    def closePool(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def evaluateIndividuals(self, individuals):
+        """
+        Inputs : individuals whose fitness must be calculated
+        Outputs: None, the fitness values are assigned to the individuals.
+                 With incremental_eval (and no worker pool) each one keeps
+                 its split state and the mutation-only children are
+                 evaluated from their parent's state, with batch_eval the
+                 whole group goes through evaluate_batch, otherwise each one
+                 goes through evaluate with toolbox.map. With the fitness
+                 cache only the routes not seen recently are evaluated.
+        """
+        if self.fitness_cache is not None:
+            self.fitnesses = self.fitness_cache.evaluate(individuals, self.evaluateResults)
+        else:
+            self.fitnesses = self.evaluateResults(individuals)
+
+        if self.incrementalEval():
+            for ind, (fit, split_state) in zip(individuals, self.fitnesses):
+                ind.fitness.values, ind.split_state = fit, split_state
+                ind.changed_positions = None
+        else:
+            for ind, fit in zip(individuals, self.fitnesses):
+                ind.fitness.values = fit
 
+    def incrementalEval(self):
+        """
+        Outputs: True if the individuals are evaluated incrementally, which
+                 needs incremental_eval, no worker pool and the greedy decoder
+        """
+        return self.incremental_eval and self.pool is None and self.decoder == 'greedy'
+
+    def evaluateResults(self, individuals):
+        """
+        Inputs : individuals to evaluate
+        Outputs: list of the fitness of each one, with incremental_eval the
+                 tuple of its fitness and split state (the value kept by
+                 the fitness cache)
+        """
+        if self.incrementalEval():
+            results = []
+            for ind in individuals:
+                parent_state = getattr(ind, 'split_state', None)
+                changed_positions = getattr(ind, 'changed_positions', None)
+                if parent_state is not None and changed_positions is not None:
+                    results.append(self.toolbox.evaluate_incremental(
+                        ind, parent_state=parent_state, changed_positions=changed_positions))
+                else:
+                    results.append(self.toolbox.evaluate_state(ind))
+            return results
+        if self.batch_eval:
+            return self.toolbox.evaluate_batch(individuals)
+        return list(self.toolbox.map(self.toolbox.evaluate, individuals))
+
+    def mutateOffspring(self, ind):
+        """
+        Inputs : offspring individual
+        Outputs: None, the individual is mutated in place. If it still had
+                 its parent's fitness and the mutation changed it, the
+                 fitness is invalidated; with incremental_eval the changed
+                 positions are kept for eval_incremental_fitness.
+        """
+        if not ind.fitness.valid:
+            self.toolbox.mutate(ind)
+            return
+
+        if self.incrementalEval():
+            changed_positions = self.toolbox.mutate_changes(ind)
+            if changed_positions:
+                del ind.fitness.values
+                ind.changed_positions = changed_positions
+            return
+        parent = list(ind)
+        self.toolbox.mutate(ind)
+        if parent != ind:
+            del ind.fitness.values
+
+    def seedPopulation(self, routes):
+        """
+        Inputs : routes of the initial population (individuals or 2d array)
+        Outputs: None, the first routes are replaced by the seedRoutes of
+                 the seeding sources, at most seed_ratio of the population
+        """
+        if not self.seeding:
+            return
+        seeds = seedRoutes(self.json_instance, self.seeding, int(self.seed_ratio * len(routes)))
+        for route, seed in zip(routes, seeds):
+            route[:] = seed
+        print(f"Seeded {len(seeds)} individuals from {', '.join(self.seeding)}")
+
+    def checkStop(self, evals, fitness=None):
+        """
+        Inputs : number of evaluations of the generation just recorded,
+                 fitness array of the population (read from the
+                 individuals if None)
+        Outputs: reason to stop the run, also kept in stop_reason, or None
+                 (always None without the stopping criteria)
+        """
+        if self.stopping is None:
+            return None
+        if fitness is None:
+            fitness = numpy.array([ind.fitness.values for ind in self.pop], dtype=numpy.float64)
+        self.stop_reason = self.stopping.update(fitness, evals)
+        if self.stop_reason is not None:
+            print(f"Stopping early: {self.stop_reason}")
+        return self.stop_reason
 
     def generatingPopFitness(self):
         self.pop = self.toolbox.population(n=self.pop_size)
+        self.seedPopulation(self.pop)
         self.invalid_ind = [ind for ind in self.pop if not ind.fitness.valid]
-        self.fitnesses = list(map(self.toolbox.evaluate, self.invalid_ind))
-
-        for ind, fit in zip(self.invalid_ind, self.fitnesses):
-            ind.fitness.values = fit
+        self.evaluateIndividuals(self.invalid_ind)
 
         self.pop = self.toolbox.select(self.pop, len(self.pop))
 
-        recordStat(self.invalid_ind, self.logbook, self.pop, self.stats, gen = 0)
+        recordStat(self.invalid_ind, self.logbook, self.pop, self.stats, gen = 0,
+                   sink=self.results_writer, history=self.history_size, extra=self.extraRecord())
+        self.checkStop(len(self.invalid_ind))
 
 
     def runGenerations(self):
-        for gen in range(self.num_gen):
+        for gen in range(self.start_gen, self.num_gen):
             print(f"{20*'#'} Currently Evaluating {gen} Generation {20*'#'}")
 
             self.offspring = tools.selTournamentDCD(self.pop, len(self.pop))
@@ -282,47 +861,239 @@ class nsgaAlgo(object):
 
             for ind1, ind2 in zip(self.offspring[::2], self.offspring[1::2]):
                 if random.random() <= self.cross_prob:
-                    self.toolbox.mate(ind1, ind2)
+                    # cxOrderedVrp returns the children, the parents are not changed
+                    ind1[:], ind2[:] = self.toolbox.mate(ind1, ind2)
 
                     del ind1.fitness.values, ind2.fitness.values
-                self.toolbox.mutate(ind1)
-                self.toolbox.mutate(ind2)
+                self.mutateOffspring(ind1)
+                self.mutateOffspring(ind2)
 
             self.invalid_ind = [ind for ind in self.offspring if not ind.fitness.valid]
-            self.fitnesses = self.toolbox.map(self.toolbox.evaluate, self.invalid_ind)
-            for ind, fit in zip(self.invalid_ind, self.fitnesses):
-                ind.fitness.values = fit
+            self.evaluateIndividuals(self.invalid_ind)
 
-            self.pop = self.toolbox.select(self.pop + self.offspring, self.pop_size)
+            candidates = self.pop + self.offspring
+            if self.dedup != 'none':
+                self.invalid_ind += self.replaceDuplicateIndividuals(candidates)
+            self.pop = self.toolbox.select(candidates, self.pop_size)
 
             # Recording stats in this generation
-            recordStat(self.invalid_ind, self.logbook, self.pop, self.stats, gen + 1)
+            recordStat(self.invalid_ind, self.logbook, self.pop, self.stats, gen + 1,
+                       sink=self.results_writer, history=self.history_size, extra=self.extraRecord())
+
+            if self.checkpoint_every and (gen + 1) % self.checkpoint_every == 0:
+                self.saveCheckpoint(gen + 1)
+            if self.checkStop(len(self.invalid_ind)):
+                break
 
         print(f"{20 * '#'} End of Generations {20 * '#'} ")
 
+    def evaluateRows(self, rows):
+        """
+        Inputs : 2d array of routes
+        Outputs: 2d array of their fitness values, evaluated at once with
+                 evaluate_batch (in the worker pool if there is one)
+        """
+        if not len(rows):
+            return numpy.zeros((0, self.numObjectives()), dtype=numpy.float64)
+        if self.fitness_cache is not None:
+            return numpy.array(self.fitness_cache.evaluate(rows, self.toolbox.evaluate_batch), dtype=numpy.float64)
+        return numpy.array(self.toolbox.evaluate_batch(rows), dtype=numpy.float64)
+
+    def selectRows(self, pop, fitness, k):
+        """
+        Inputs : 2d arrays of routes and fitness values, number of rows to keep
+        Outputs: None, pop, fitness and crowding are set to the k rows chosen
+                 by the NSGA-II selection
+        """
+        chosen, crowding = selectNSGA2Indices(fitness, fitness, k)
+        self.pop, self.fitness, self.crowding = pop[chosen], fitness[chosen], crowding[chosen]
+
+    def generatingArrayPop(self):
+        self.pop = numpy.array([self.toolbox.indexes() for _ in range(self.pop_size)], dtype=numpy.int32)
+        self.seedPopulation(self.pop)
+        self.selectRows(self.pop, self.evaluateRows(self.pop), len(self.pop))
+
+        recordArrayStat(len(self.pop), self.logbook, self.pop, self.fitness, gen=0,
+                        sink=self.results_writer, history=self.history_size, extra=self.extraRecord())
+        self.checkStop(len(self.pop), self.fitness)
+
+    def runArrayGenerations(self):
+        """
+        Same generations as runGenerations on the array population: the
+        offspring is one copy of the rows won in the tournaments, all the
+        mating pairs are crossed at once by mate_batch and mutated at once
+        by mutate_batch, only the changed rows are evaluated (as one batch)
+        and the selection works on the fitness matrix. The operators draw
+        with numpy, so the run follows the same distribution as
+        runGenerations but not the same random sequence.
+        """
+        for gen in range(self.start_gen, self.num_gen):
+            print(f"{20*'#'} Currently Evaluating {gen} Generation {20*'#'}")
+
+            parents = selTournamentDCDIndices(self.fitness, self.crowding, len(self.pop))
+            offspring, offspring_fitness = self.pop[parents], self.fitness[parents]
+            valid = numpy.ones(len(offspring), dtype=bool)
+
+            pairs = numpy.arange(0, len(offspring) - 1, 2)
+            mating = pairs[numpy.random.random(len(pairs)) <= self.cross_prob]
+            offspring[mating], offspring[mating + 1] = self.toolbox.mate_batch(offspring[mating],
+                                                                               offspring[mating + 1])
+            valid[mating] = valid[mating + 1] = False
+
+            # The children of the pairs, as runGenerations mutates them
+            valid[:2 * len(pairs)] &= ~self.toolbox.mutate_batch(offspring[:2 * len(pairs)])
+
+            invalid = numpy.flatnonzero(~valid)
+            offspring_fitness[invalid] = self.evaluateRows(offspring[invalid])
+            evals = len(invalid)
+
+            candidates = numpy.concatenate((self.pop, offspring))
+            candidates_fitness = numpy.concatenate((self.fitness, offspring_fitness))
+            if self.dedup != 'none':
+                replaced = replaceDuplicates(candidates, self.duplicateReplacement())
+                candidates_fitness[replaced] = self.evaluateRows(candidates[replaced])
+                self.duplicates = len(replaced)
+                evals += len(replaced)
+            self.selectRows(candidates, candidates_fitness, self.pop_size)
+
+            # Recording stats in this generation
+            recordArrayStat(evals, self.logbook, self.pop, self.fitness, gen + 1,
+                            sink=self.results_writer, history=self.history_size, extra=self.extraRecord())
+
+            if self.checkpoint_every and (gen + 1) % self.checkpoint_every == 0:
+                self.saveCheckpoint(gen + 1)
+            if self.checkStop(evals, self.fitness):
+                break
+
+        print(f"{20 * '#'} End of Generations {20 * '#'} ")
 
     def getBestInd(self):
-        self.best_individual = tools.selBest(self.pop, 1)[0]
+        if self.engine == 'array':
+            best = numpy.lexsort(self.fitness.T[::-1])[0]
+            self.best_individual = self.individual_class(self.pop[best].tolist())
+            self.best_individual.fitness.values = tuple(self.fitness[best].tolist())
+        else:
+            self.best_individual = tools.selBest(self.pop, 1)[0]
 
         print(f"Best individual is {self.best_individual}")
         print(f"Number of vechicles required are "
               f"{self.best_individual.fitness.values[0]}")
         print(f"Cost required for the transportation is "
               f"{self.best_individual.fitness.values[1]}")
-
-        printRoute(routeToSubroute(self.best_individual, self.json_instance))
+        if self.numObjectives() == 3:
+            print(f"Lateness of the routes is {self.best_individual.fitness.values[2]}")
+
+        printRoute(routeToSubroute(self.best_individual, self.json_instance, self.decoder))
+
+    def resultsName(self):
+        # The greedy decoder keeps the names of the results done before the
+        # other decoders
+        decoder = f"_decoder{self.decoder}" if self.decoder != 'greedy' else ""
+        return f"{self.json_instance['instance_name']}_" \
+               f"pop{self.pop_size}_crossProb{self.cross_prob}" \
+               f"_mutProb{self.mut_prob}_numGen{self.num_gen}{decoder}"
+
+    def openResults(self):
+        """
+        Opens the ResultsWriter of the run in results, the generations are
+        written to it by recordStat as they finish.
+        """
+        self.results_writer = ResultsWriter(os.path.join(BASE_DIR, "results", f"{self.resultsName()}.csv"))
+
+    def checkpointPath(self):
+        return os.path.join(BASE_DIR, "results", f"{self.resultsName()}.checkpoint.npz")
+
+    def checkpointParameters(self):
+        return {'instance_name': self.json_instance['instance_name'], 'ind_size': self.ind_size,
+                'pop_size': self.pop_size, 'cross_prob': self.cross_prob, 'mut_prob': self.mut_prob,
+                'decoder': self.decoder}
+
+    def saveCheckpoint(self, generation):
+        """
+        Inputs : number of generations done
+        Outputs: None, the population, the random states and the results
+                 written so far are checkpointed to checkpointPath
+        """
+        results_offsets = self.results_writer.offsets() if self.results_writer is not None else (0, 0)
+        if self.engine == 'array':
+            saveCheckpoint(self.checkpointPath(), self.pop, generation, results_offsets, fitness=self.fitness,
+                           crowding_dist=self.crowding, **self.checkpointParameters())
+        else:
+            saveCheckpoint(self.checkpointPath(), self.pop, generation, results_offsets,
+                           **self.checkpointParameters())
+
+    def restoreCheckpoint(self):
+        """
+        Outputs: True if the run was restored from checkpointPath: the
+                 population, the random states and start_gen are set and
+                 the results are reopened where the checkpoint left them.
+                 False if there is no checkpoint.
+        """
+        if not os.path.exists(self.checkpointPath()):
+            return False
+        arrays = loadCheckpoint(self.checkpointPath())
+        if arrays['parameters'] != self.checkpointParameters():
+            raise ValueError(f"checkpoint {self.checkpointPath()} was taken with "
+                             f"{arrays['parameters']}, not {self.checkpointParameters()}")
+
+        if self.engine == 'array':
+            self.pop, self.fitness, self.crowding = arrays['population'], arrays['fitness'], arrays['crowding_dist']
+        else:
+            self.pop = restorePopulation(arrays, self.individual_class)
+        self.start_gen = int(arrays['generation'])
+        setRandomState(arrays)
+        self.results_writer = ResultsWriter(os.path.join(BASE_DIR, "results", f"{self.resultsName()}.csv"),
+                                            resume_offsets=arrays['results_offsets'].tolist())
+        print(f"Resuming from generation {self.start_gen} of {self.checkpointPath()}")
+        return True
 
     def doExport(self):
-        csv_file_name = f"{self.json_instance['instance_name']}_" \
-                        f"pop{self.pop_size}_crossProb{self.cross_prob}" \
-                        f"_mutProb{self.mut_prob}_numGen{self.num_gen}.csv"
+        # Why the run ended, kept in the .npz next to the logbook arrays
+        run_arrays = {'stop_reason': numpy.array(self.stop_reason or 'max_generations')}
+        if self.results_writer is not None:
+            # The csv is already written, the partial results become the .npz
+            self.results_writer.close(**run_arrays)
+            self.results_writer = None
+            return
+        csv_file_name = f"{self.resultsName()}.csv"
         exportCsv(csv_file_name, self.logbook)
+        # Columnar copy of the logbook, read by nsga.results.loadResults
+        exportResults(os.path.join(BASE_DIR, "results", f"{self.resultsName()}.npz"), self.logbook, **run_arrays)
 
     def runMain(self):
-        self.generatingPopFitness()
-        self.runGenerations()
+        self.registerOperators()
+        # Counted from here, a resumed run starts its budgets and window again
+        self.stopping = None
+        if self.stagnation_window or self.time_budget or self.eval_budget:
+            self.stopping = StoppingCriteria(self.stagnation_window, self.stagnation_metric,
+                                             self.stagnation_tolerance, self.time_budget, self.eval_budget)
+        self.stop_reason = None
+        if not (self.resume and self.restoreCheckpoint()):
+            self.start_gen = 0
+            self.openResults()
+        try:
+            if self.engine == 'array':
+                if self.start_gen == 0:
+                    self.generatingArrayPop()
+                if self.stop_reason is None:
+                    self.runArrayGenerations()
+            else:
+                if self.start_gen == 0:
+                    self.generatingPopFitness()
+                if self.stop_reason is None:
+                    self.runGenerations()
+        except BaseException:
+            # The generations done stay in the csv and the partial results
+            self.results_writer.abort()
+            self.results_writer = None
+            raise
+        finally:
+            self.closePool()
         self.getBestInd()
         self.doExport()
+        # The run is complete, there is nothing left to resume
+        if os.path.exists(self.checkpointPath()):
+            os.remove(self.checkpointPath())
 
 
 
@@ -0,0 +1,78 @@
+import array
+from collections import OrderedDict
+
+import numpy
+
+
+def routeKey(route):
+    """
+    Inputs : route (list of customers or 1d integer array)
+    Outputs: bytes of the route as int32, the same for a list and for a row
+             of the array engine
+    """
+    if isinstance(route, numpy.ndarray):
+        return numpy.ascontiguousarray(route, dtype=numpy.int32).tobytes()
+    return array.array('i', route).tobytes()
+
+
+class FitnessCache(object):
+    """
+    LRU cache of evaluation results keyed by the bytes of the route, so an
+    individual already evaluated (a clone of a parent, or a route created
+    again by the operators) costs a dict lookup. Holds at most maxsize
+    routes, the least recently used one is evicted first. The hits and
+    misses are counted for the logbook.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.reported = (0, 0)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def evaluate(self, routes, evaluate):
+        """
+        Inputs : routes - individuals (or 2d array of routes) to evaluate
+                 evaluate - function that evaluates a list (or array) of
+                            routes and returns their results in order
+        Outputs: list of the result of each route. Only the routes not in
+                 the cache are evaluated, each distinct route once; a
+                 repeated route counts as a hit
+        """
+        results = [None] * len(routes)
+        pending = OrderedDict()
+        for index, key in enumerate(map(routeKey, routes)):
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                results[index] = result
+            else:
+                pending.setdefault(key, []).append(index)
+        self.misses += len(pending)
+        self.hits += len(routes) - len(pending)
+        if not pending:
+            return results
+
+        first = [indices[0] for indices in pending.values()]
+        misses = routes[first] if isinstance(routes, numpy.ndarray) else [routes[index] for index in first]
+        for (key, indices), result in zip(pending.items(), evaluate(misses)):
+            self.entries[key] = result
+            for index in indices:
+                results[index] = result
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return results
+
+    def generationRecord(self):
+        """
+        Outputs: dict with the hits, misses and hit rate since the last call,
+                 the cache columns of the logbook
+        """
+        hits, misses = self.hits - self.reported[0], self.misses - self.reported[1]
+        self.reported = (self.hits, self.misses)
+        return {'cache_hits': hits, 'cache_misses': misses,
+                'cache_hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0}
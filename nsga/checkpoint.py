@@ -0,0 +1,98 @@
+import random
+
+import numpy
+
+from nsga.instance import _atomicSave
+
+
+def randomStateArrays():
+    """
+    Inputs : None
+    Outputs: dict of arrays with the state of the random module and of the
+             numpy global generator
+    """
+    version, internal_state, gauss_next = random.getstate()
+    _, keys, position, has_gauss, cached_gaussian = numpy.random.get_state()
+    return {
+        'random_version': numpy.array(version),
+        'random_state': numpy.array(internal_state, dtype=numpy.int64),
+        'random_gauss': numpy.array(numpy.nan if gauss_next is None else gauss_next),
+        'numpy_keys': keys,
+        'numpy_state': numpy.array([position, has_gauss], dtype=numpy.int64),
+        'numpy_gauss': numpy.array(cached_gaussian),
+    }
+
+
+def setRandomState(arrays):
+    """
+    Inputs : dict of arrays of randomStateArrays
+    Outputs: None, the random module and numpy are set to that state
+    """
+    gauss_next = float(arrays['random_gauss'])
+    random.setstate((int(arrays['random_version']),
+                     tuple(arrays['random_state'].tolist()),
+                     None if numpy.isnan(gauss_next) else gauss_next))
+    position, has_gauss = arrays['numpy_state'].tolist()
+    numpy.random.set_state(('MT19937', arrays['numpy_keys'], position, has_gauss,
+                            float(arrays['numpy_gauss'])))
+
+
+def saveCheckpoint(checkpoint_path, population, generation, results_offsets=(0, 0), fitness=None,
+                   crowding_dist=None, **parameters):
+    """
+    Inputs : checkpoint_path - path of the .npz
+             population - individuals with valid fitness (and crowding
+                          distance, set by selNSGA2), or the 2d array of
+                          routes of the array engine
+             generation - number of generations done
+             results_offsets - sizes of the results csv and partial file
+                               written up to this generation
+             fitness, crowding_dist - arrays of the array engine population,
+                                      read from the individuals if None
+             parameters - run parameters saved to check the resume against
+    Outputs: None, the population as an int32 matrix, its fitness and
+             crowding distances, the random states, the generation and the
+             results offsets are saved atomically
+    """
+    if fitness is None:
+        fitness = [ind.fitness.values for ind in population]
+    if crowding_dist is None:
+        crowding_dist = [getattr(ind.fitness, 'crowding_dist', numpy.nan) for ind in population]
+    arrays = {
+        'population': numpy.array(population, dtype=numpy.int32),
+        'fitness': numpy.array(fitness, dtype=numpy.float64),
+        'crowding_dist': numpy.array(crowding_dist, dtype=numpy.float64),
+        'generation': numpy.array(generation),
+        'results_offsets': numpy.array(results_offsets, dtype=numpy.int64),
+    }
+    arrays.update(randomStateArrays())
+    arrays.update({f'parameter_{name}': numpy.array(value) for name, value in parameters.items()})
+    _atomicSave(checkpoint_path, lambda file_object: numpy.savez(file_object, **arrays))
+
+
+def loadCheckpoint(checkpoint_path):
+    """
+    Inputs : path of a checkpoint written by saveCheckpoint
+    Outputs: dict of its arrays; the saved parameters are under 'parameters'
+    """
+    with numpy.load(checkpoint_path) as npz_file:
+        arrays = {name: npz_file[name] for name in npz_file.files}
+    arrays['parameters'] = {name[len('parameter_'):]: arrays.pop(name).item()
+                            for name in list(arrays) if name.startswith('parameter_')}
+    return arrays
+
+
+def restorePopulation(arrays, individual_class):
+    """
+    Inputs : dict of loadCheckpoint, individual class (creator.Individual)
+    Outputs: list of individuals with the saved fitness and crowding distance
+    """
+    population = []
+    for route, fitness, crowding_dist in zip(arrays['population'].tolist(), arrays['fitness'].tolist(),
+                                             arrays['crowding_dist'].tolist()):
+        ind = individual_class(route)
+        ind.fitness.values = fitness
+        if not numpy.isnan(crowding_dist):
+            ind.fitness.crowding_dist = crowding_dist
+        population.append(ind)
+    return population
@@ -0,0 +1,54 @@
+import random
+
+import numpy
+
+from nsga.cache import routeKey
+
+
+def perturbRoute(route):
+    """
+    Inputs : route (list of customers or 1d array)
+    Outputs: copy of the route with a random segment reversed (a 2-opt
+             move), so it keeps most of the route's structure
+    """
+    route = list(route)
+    a, b = sorted(random.sample(range(len(route)), 2))
+    route[a:b + 1] = route[a:b + 1][::-1]
+    return route
+
+
+def replaceDuplicates(routes, fresh=None):
+    """
+    Inputs : routes - individuals (or 2d array of routes), changed in place
+             fresh - function returning a new random route; if None each
+                     duplicate is replaced by a perturbRoute of itself
+    Outputs: list of the indices of the routes that were replaced. The
+             first occurrence of a route is kept and every later copy is
+             replaced until it is unique (one hash lookup per route)
+    """
+    seen = set()
+    replaced = []
+    for index in range(len(routes)):
+        key = routeKey(routes[index])
+        if key in seen:
+            replaced.append(index)
+        while key in seen:
+            routes[index][:] = fresh() if fresh is not None else perturbRoute(routes[index])
+            key = routeKey(routes[index])
+        seen.add(key)
+    return replaced
+
+
+def positionDiversity(routes):
+    """
+    Inputs : 2d array of routes, one per row
+    Outputs: mean over the positions of the number of distinct customers
+             at that position, scaled from 0 (all the routes are the same)
+             to 1 (as many distinct customers as rows, or customers)
+    """
+    num_routes, size = routes.shape
+    if min(num_routes, size) < 2:
+        return 0.0
+    sorted_routes = numpy.sort(routes, axis=0)
+    distinct = 1 + (sorted_routes[1:] != sorted_routes[:-1]).sum(axis=0)
+    return float((distinct - 1).mean() / (min(num_routes, size) - 1))
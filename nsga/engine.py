@@ -0,0 +1,153 @@
+import random
+
+import numpy
+
+
+def dominatesRows(fitness_a, fitness_b):
+    """
+    Inputs : two (N, M) arrays of objectives to minimize
+    Outputs: bool array, True where the row of fitness_a dominates the row
+             of fitness_b (Fitness.dominates on the values)
+    """
+    return (fitness_a <= fitness_b).all(axis=1) & (fitness_a < fitness_b).any(axis=1)
+
+
+def selTournamentDCDIndices(fitness, crowding, k):
+    """
+    Inputs : fitness - (N, M) array of objectives to minimize
+             crowding - crowding distance of each row (set by the selection)
+             k - number of rows to select
+    Outputs: int array of the k rows chosen by tools.selTournamentDCD, the
+             same tournaments, played in the same order with the same random
+             calls, so it picks the same rows as deap would on the population
+    """
+    num_rows = len(fitness)
+    if k > num_rows:
+        raise ValueError("selTournamentDCD: k must be less than or equal to individuals length")
+    if k == num_rows and k % 4 != 0:
+        raise ValueError("selTournamentDCD: k must be divisible by four if k == len(individuals)")
+
+    first = numpy.array(random.sample(range(num_rows), num_rows), dtype=numpy.int64)
+    second = numpy.array(random.sample(range(num_rows), num_rows), dtype=numpy.int64)
+
+    # Contenders of each tournament, in the order deap plays them
+    starts = numpy.arange(0, k, 4)
+    contenders = numpy.empty((len(starts), 4, 2), dtype=numpy.int64)
+    contenders[:, 0] = numpy.stack((first[starts], first[starts + 1]), axis=1)
+    contenders[:, 1] = numpy.stack((first[starts + 2], first[starts + 3]), axis=1)
+    contenders[:, 2] = numpy.stack((second[starts], second[starts + 1]), axis=1)
+    contenders[:, 3] = numpy.stack((second[starts + 2], second[starts + 3]), axis=1)
+    ind1, ind2 = contenders.reshape(-1, 2)[:k].T
+
+    winners = numpy.full(len(ind1), -1, dtype=numpy.int64)
+    crowding1, crowding2 = crowding[ind1], crowding[ind2]
+    for decided, winner in ((dominatesRows(fitness[ind1], fitness[ind2]), ind1),
+                            (dominatesRows(fitness[ind2], fitness[ind1]), ind2),
+                            (crowding1 < crowding2, ind2),
+                            (crowding1 > crowding2, ind1)):
+        undecided = decided & (winners < 0)
+        winners[undecided] = winner[undecided]
+
+    # The rest is a coin toss, drawn in tournament order like deap does
+    ties = numpy.flatnonzero(winners < 0)
+    tosses = numpy.array([random.random() for _ in range(len(ties))])
+    winners[ties] = numpy.where(tosses <= 0.5, ind1[ties], ind2[ties])
+    return winners
+
+
+def orderedCutPoints(num_pairs, size):
+    """
+    Inputs : number of mating pairs, individual size (at least 2)
+    Outputs: (num_pairs, 2) int array of cut points a < b, each pair drawn
+             uniformly like random.sample(range(size), 2) in cxOrderedVrp,
+             with the numpy global generator
+    """
+    first = numpy.random.randint(0, size, num_pairs)
+    second = numpy.random.randint(0, size - 1, num_pairs)
+    second += second >= first
+    return numpy.stack((numpy.minimum(first, second), numpy.maximum(first, second)), axis=1)
+
+
+def _orderedChildren(parents, donors, cuts):
+    """
+    Inputs : (K, N) arrays of the parents and of the segment donors
+             (customers 1..N), (K, 2) array of cut points
+    Outputs: (K, N) array of the children cxOrderedVrp gives the parents:
+             the donor's segment [a, b] in place, the rest filled from
+             b + 1 on (wrapping) with the parent's customers in the
+             parent's order from b + 1, skipping the ones in the segment
+    """
+    num_pairs, size = parents.shape
+    rows = numpy.arange(num_pairs)[:, None]
+    a, b = cuts[:, :1], cuts[:, 1:]
+    # Both routes read from position b + 1, the donor's segment is then the
+    # last b - a + 1 customers of its rotation
+    rotation = (b + 1 + numpy.arange(size)) % size
+    rotated_parents = parents[rows, rotation]
+    rotated_donors = donors[rows, rotation]
+
+    positions = numpy.arange(size)
+    in_segment = numpy.zeros((num_pairs, size + 1), dtype=bool)
+    in_segment[rows, donors] = (positions >= a) & (positions <= b)
+    kept = ~in_segment[rows, rotated_parents]
+
+    # The kept customers go, in order, before the donor's segment
+    filled = rotated_donors.copy()
+    kept_rows, kept_positions = numpy.nonzero(kept)
+    filled[kept_rows, (numpy.cumsum(kept, axis=1) - 1)[kept]] = rotated_parents[kept_rows, kept_positions]
+
+    # Back from the rotation: position (b + 1 + j) % N holds filled[j]
+    return filled[rows, (positions - b - 1) % size]
+
+
+def cxOrderedBatch(parents1, parents2, cuts=None):
+    """
+    Inputs : parents1, parents2 - (K, N) arrays, row i of each is a mating
+                                  pair (routes of customers 1..N)
+             cuts - (K, 2) array of cut points a < b, drawn with
+                    orderedCutPoints if None
+    Outputs: tuple of the (K, N) arrays of the first and second children,
+             the same children cxOrderedVrp gives each pair for the same
+             cut points; the parents are not changed
+    """
+    parents1 = numpy.asarray(parents1)
+    parents2 = numpy.asarray(parents2)
+    if cuts is None:
+        cuts = orderedCutPoints(len(parents1), parents1.shape[1])
+    return _orderedChildren(parents1, parents2, cuts), _orderedChildren(parents2, parents1, cuts)
+
+
+def mutationShuffleBatch(routes, indpb):
+    """
+    Inputs : routes - (K, N) array of routes, mutated in place
+             indpb - probability of mutation of each position
+    Outputs: bool array, True for the routes the mutation changed
+
+    mutationShuffle on every row: each position is swapped, with
+    probability indpb, with another position drawn uniformly. The mask of
+    the positions to swap is drawn for the whole block at once and only
+    the swaps are applied; the swaps of a row are applied in position
+    order like mutationShuffle does, the j-th swap of all the rows at a
+    time.
+    """
+    num_routes, size = routes.shape
+    swap_rows, swap_positions = numpy.nonzero(numpy.random.random((num_routes, size)) < indpb)
+    swap_with = numpy.random.randint(0, size - 1, len(swap_rows))
+    swap_with += swap_with >= swap_positions
+
+    changed = numpy.zeros(num_routes, dtype=bool)
+    if not len(swap_rows):
+        return changed
+    touched = numpy.unique(swap_rows)
+    before = routes[touched]
+
+    # Order of each swap among the swaps of its row
+    swap_order = numpy.arange(len(swap_rows)) - numpy.searchsorted(swap_rows, swap_rows)
+    for order in range(swap_order.max() + 1):
+        current = swap_order == order
+        rows, first, second = swap_rows[current], swap_positions[current], swap_with[current]
+        routes[rows, first], routes[rows, second] = routes[rows, second], routes[rows, first]
+
+    # Swaps can undo each other
+    changed[touched] = (routes[touched] != before).any(axis=1)
+    return changed
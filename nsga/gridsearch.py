@@ -0,0 +1,108 @@
+import os
+import csv
+import time
+import random
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy
+
+from nsga.NSGA2 import nsgaAlgo, load_instance, BASE_DIR
+
+
+# Instance loaded once in each worker process by the pool initializer
+_WORKER_INSTANCE = None
+
+
+def _initWorker(instance):
+    global _WORKER_INSTANCE
+    _WORKER_INSTANCE = instance
+    # Forked workers would otherwise share the random states of the parent
+    # (the array engine and the seeding heuristics draw from numpy)
+    random.seed()
+    numpy.random.seed()
+
+
+def runConfig(config, instance=None, quiet=True):
+    """
+    Inputs : config - dict with pop, cross, mut and gen (population size,
+                      crossover and mutation probabilities, generations),
+                      optional id and options (nsgaAlgo attributes such as
+                      batch_eval)
+             instance - loaded instance, the worker one if not given
+             quiet - drop the per generation prints of the run
+    Outputs: record dict of the run, the results csv is exported as usual
+    """
+    instance = instance if instance is not None else _WORKER_INSTANCE
+    nsgaObj = nsgaAlgo(instance=instance)
+    nsgaObj.pop_size = config['pop']
+    nsgaObj.cross_prob = config['cross']
+    nsgaObj.mut_prob = config['mut']
+    nsgaObj.num_gen = config['gen']
+    for attribute, value in config.get('options', {}).items():
+        setattr(nsgaObj, attribute, value)
+
+    start_time = time.perf_counter()
+    if quiet:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            nsgaObj.runMain()
+    else:
+        nsgaObj.runMain()
+    execution_time = time.perf_counter() - start_time
+
+    best = nsgaObj.logbook[-1]['min']
+    record = {
+        'Population': config['pop'],
+        'Crossover': config['cross'],
+        'Mutation': config['mut'],
+        'Generations': config['gen'],
+        'Best_Vehicles': float(best[0]),
+        'Best_Cost': float(best[1]),
+        'Execution_Time_s': round(execution_time, 2),
+    }
+    if 'id' in config:
+        record = {'Config_ID': config['id'], **record}
+    return record
+
+
+def iterGridSearch(instance, configs, workers=None):
+    """
+    Inputs : instance - loaded instance or path to it
+             configs - list of config dicts (see runConfig)
+             workers - number of processes, None uses every core
+    Outputs: yields (index of the config, record) as each run finishes.
+             The instance is sent once to each worker, not loaded per run.
+    """
+    if isinstance(instance, str):
+        instance = load_instance(instance)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                             initargs=(instance,)) as executor:
+        futures = {executor.submit(runConfig, config): index for index, config in enumerate(configs)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def runGridSearch(instance, configs, workers=None):
+    """
+    Inputs : same as iterGridSearch
+    Outputs: list of records in the order of configs
+    """
+    records = [None] * len(configs)
+    for index, record in iterGridSearch(instance, configs, workers):
+        records[index] = record
+    return records
+
+
+def exportSummary(records, csv_file_name='MASTER_SUMMARY.csv', columns=None):
+    """
+    Inputs : records of runGridSearch, csv file name in results, columns
+             (all the record keys by default)
+    Outputs: path of the written csv
+    """
+    columns = columns or list(records[0].keys())
+    csv_path = os.path.join(BASE_DIR, "results", csv_file_name)
+    with open(csv_path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(records)
+    return csv_path
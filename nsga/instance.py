@@ -0,0 +1,328 @@
+import os
+import io
+import copy
+import hashlib
+import json
+import numpy
+from collections import OrderedDict
+
+
+# Node arrays of the compiled instance, in the order they are cached
+NODE_ARRAYS = ('demand', 'coordinates', 'ready_time', 'due_time', 'service_time')
+
+# How the distances are kept: the full precomputed matrix, or only the
+# coordinates with the distances computed when they are read
+DISTANCE_MODES = ('matrix', 'lazy')
+
+
+def euclideanDistanceMatrix(coordinates, block_rows=1024):
+    """
+    Inputs: (N+1)x2 coordinates, number of rows computed per block
+    Outputs: (N+1)x(N+1) float64 matrix of euclidean distances, computed
+             with broadcasting one block of rows at a time so the temporary
+             arrays stay bounded
+    """
+    coordinates = numpy.asarray(coordinates, dtype=numpy.float64)
+    num_nodes = len(coordinates)
+    distance_matrix = numpy.empty((num_nodes, num_nodes), dtype=numpy.float64)
+    for start in range(0, num_nodes, block_rows):
+        delta = coordinates[start:start + block_rows, None, :] - coordinates[None, :, :]
+        distance_matrix[start:start + block_rows] = numpy.sqrt((delta ** 2).sum(axis=2))
+    return distance_matrix
+
+
+class LazyDistanceMatrix(object):
+    """
+    Distance matrix that only stores the coordinates, for instances too big
+    for the O(N^2) matrix. Indexing follows numpy: matrix[rows, cols] with
+    index arrays gives the distances of the (row, col) pairs computed in
+    one vectorized batch, a slice gives the whole block and matrix[i] (or
+    matrix[i][j]) gives row i.
+
+    Full rows are kept in a LRU cache of at most cache_rows rows, filled when
+    a single node is read against many (the depot row is read by every
+    evaluation), so memory stays bounded by cache_rows x N.
+    The distances are euclidean, so the matrix is symmetric.
+    """
+
+    def __init__(self, coordinates, cache_rows=16):
+        self.coordinates = numpy.ascontiguousarray(coordinates, dtype=numpy.float64)
+        self.shape = (len(self.coordinates), len(self.coordinates))
+        self.dtype = numpy.dtype(numpy.float64)
+        self.cache_rows = cache_rows
+        self.rows = OrderedDict()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def row(self, node_id):
+        """
+        Inputs: node id
+        Outputs: distances from the node to every node, cached in the LRU
+        """
+        node_id = int(node_id)
+        cached = self.rows.get(node_id)
+        if cached is not None:
+            self.rows.move_to_end(node_id)
+            return cached
+
+        delta = self.coordinates - self.coordinates[node_id]
+        distances = numpy.sqrt((delta ** 2).sum(axis=1))
+        if self.cache_rows > 0:
+            self.rows[node_id] = distances
+            if len(self.rows) > self.cache_rows:
+                self.rows.popitem(last=False)
+        return distances
+
+    def distances(self, rows, cols):
+        """
+        Inputs: index arrays (or node ids) of the same broadcast shape
+        Outputs: distances of the (row, col) pairs
+        """
+        delta = self.coordinates[rows] - self.coordinates[cols]
+        return numpy.sqrt((delta ** 2).sum(axis=-1))
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            return self.row(key)
+
+        rows, cols = key
+        if isinstance(rows, slice) or isinstance(cols, slice):
+            rows = numpy.arange(self.shape[0])[rows] if isinstance(rows, slice) else rows
+            cols = numpy.arange(self.shape[1])[cols] if isinstance(cols, slice) else cols
+            return self.distances(numpy.asarray(rows)[..., None], numpy.asarray(cols))
+
+        row_scalar, col_scalar = numpy.ndim(rows) == 0, numpy.ndim(cols) == 0
+        if row_scalar and int(rows) in self.rows:
+            return self.row(rows)[cols]
+        if col_scalar and int(cols) in self.rows:
+            return self.row(cols)[rows]
+        if row_scalar and not col_scalar:
+            return self.row(rows)[cols]
+        if col_scalar and not row_scalar:
+            return self.row(cols)[rows]
+        return self.distances(rows, cols)
+
+
+class VrpInstance(dict):
+    """
+    Json instance problem compiled in to contiguous numpy arrays.
+
+    It still behaves as the loaded json dict (instance['vehicle_capacity'],
+    instance['instance_name'] ...), so every function that receives the
+    json object keeps working, while the fitness functions read the arrays:
+        demand         - float64 vector, index 0 is the depot
+        capacity       - vehicle capacity as float
+        whole_demand   - True if every demand is a whole number that fits
+                         in a vehicle (the sums of demands are then exact)
+        distance_matrix - float64 (N+1)x(N+1) matrix, index 0 is the depot,
+                          or a LazyDistanceMatrix with distance_mode='lazy'
+        coordinates    - float64 (N+1)x2 matrix of x, y
+        ready_time, due_time, service_time - float64 vectors
+    """
+
+    def __init__(self, json_data, distance_mode='matrix', cache_rows=16):
+        super().__init__(json_data)
+        num_customers = int(json_data['Number_of_customers'])
+
+        nodes = [json_data['depart']] + \
+                [json_data[f'customer_{x}'] for x in range(1, num_customers + 1)]
+        coordinates = numpy.array([[node['coordinates']['x'], node['coordinates']['y']]
+                                   for node in nodes], dtype=numpy.float64)
+
+        self.setArrays(
+            demand=numpy.array([node['demand'] for node in nodes], dtype=numpy.float64),
+            coordinates=coordinates,
+            ready_time=numpy.array([node['ready_time'] for node in nodes], dtype=numpy.float64),
+            due_time=numpy.array([node['due_time'] for node in nodes], dtype=numpy.float64),
+            service_time=numpy.array([node['service_time'] for node in nodes], dtype=numpy.float64),
+            distance_matrix=buildDistanceMatrix(json_data.get('distance_matrix'), coordinates,
+                                                distance_mode, cache_rows))
+
+    @classmethod
+    def fromArrays(cls, header, distance_matrix, **node_arrays):
+        """
+        Inputs: header - the scalar json keys (instance_name, vehicle_capacity ...)
+                distance_matrix - distance matrix array
+                node_arrays - the NODE_ARRAYS, index 0 is the depot
+        Outputs: VrpInstance, the depart and customer_x json entries are
+                 rebuilt from the arrays
+        """
+        instance = cls.__new__(cls)
+        dict.__init__(instance, header)
+        for node_id in range(len(node_arrays['demand'])):
+            key = 'depart' if node_id == 0 else f'customer_{node_id}'
+            instance[key] = {
+                'coordinates': {
+                    'x': float(node_arrays['coordinates'][node_id, 0]),
+                    'y': float(node_arrays['coordinates'][node_id, 1]),
+                },
+                'demand': float(node_arrays['demand'][node_id]),
+                'ready_time': float(node_arrays['ready_time'][node_id]),
+                'due_time': float(node_arrays['due_time'][node_id]),
+                'service_time': float(node_arrays['service_time'][node_id]),
+            }
+        instance.setArrays(distance_matrix=distance_matrix, **node_arrays)
+        return instance
+
+    def setArrays(self, distance_matrix, **node_arrays):
+        self.num_customers = int(self['Number_of_customers'])
+        self.capacity = float(self['vehicle_capacity'])
+        for name in NODE_ARRAYS:
+            setattr(self, name, node_arrays[name])
+        self.whole_demand = bool((self.demand == numpy.floor(self.demand)).all()
+                                 and self.demand.max() <= self.capacity)
+
+        self.distance_matrix = distance_matrix
+        # Nested json list is replaced by the array, it still supports [i][j]
+        self['distance_matrix'] = self.distance_matrix
+
+    def header(self):
+        """
+        Outputs: dict of the scalar json keys, without the nodes and the matrix
+        """
+        return {key: value for key, value in self.items()
+                if key not in ('depart', 'distance_matrix') and not key.startswith('customer_')}
+
+    def withDistanceMatrix(self, distance_matrix):
+        """
+        Inputs: distance matrix (array, shared memory view or None)
+        Outputs: shallow copy of the instance using that distance matrix,
+                 the other arrays are shared with this instance
+        """
+        other = copy.copy(self)
+        other.distance_matrix = distance_matrix
+        other['distance_matrix'] = distance_matrix
+        return other
+
+
+def buildDistanceMatrix(distance_matrix, coordinates, distance_mode='matrix', cache_rows=16):
+    """
+    Inputs: distance matrix stored with the instance (None if it has only
+            the coordinates), coordinates, distance mode and LRU rows
+    Outputs: the distance matrix for the mode: the stored matrix as an array
+             (computed from the coordinates when missing) or a
+             LazyDistanceMatrix, which ignores the stored one
+    """
+    if distance_mode not in DISTANCE_MODES:
+        raise ValueError(f"distance_mode must be one of {DISTANCE_MODES}, got {distance_mode!r}")
+    if distance_mode == 'lazy':
+        return LazyDistanceMatrix(coordinates, cache_rows)
+    if distance_matrix is None:
+        return euclideanDistanceMatrix(coordinates)
+    if isinstance(distance_matrix, numpy.ndarray):
+        return distance_matrix
+    return numpy.ascontiguousarray(distance_matrix, dtype=numpy.float64)
+
+
+def compileInstance(instance, distance_mode='matrix', cache_rows=16):
+    """
+    Inputs: json file object loaded instance, or an already compiled one
+            distance mode ('matrix' or 'lazy') and LRU rows of the lazy mode
+    Outputs: VrpInstance built from it (the same object if already compiled)
+    """
+    if isinstance(instance, VrpInstance):
+        return instance
+    return VrpInstance(instance, distance_mode, cache_rows)
+
+
+def fileHash(file_path, block_size=1 << 20):
+    """
+    Inputs: path to a file
+    Outputs: sha1 hex digest of its content
+    """
+    digest = hashlib.sha1()
+    with io.open(file_path, 'rb') as file_object:
+        for block in iter(lambda: file_object.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cachePaths(json_file, source_hash):
+    """
+    Inputs: path to the json instance and the hash of its content
+    Outputs: tuple of paths (arrays .npz, distance matrix .npy) of the binary
+             cache, kept in a .cache directory alongside the json file
+    """
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(json_file)), '.cache')
+    stem = os.path.splitext(os.path.basename(json_file))[0]
+    prefix = os.path.join(cache_dir, f'{stem}-{source_hash[:16]}')
+    return f'{prefix}.npz', f'{prefix}.distance_matrix.npy'
+
+
+def _atomicSave(path, save):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with io.open(tmp_path, 'wb') as file_object:
+        save(file_object)
+    os.replace(tmp_path, path)
+
+
+def matrixPath(arrays_path):
+    """
+    Inputs: path to the .npz arrays of a binary instance
+    Outputs: path to its distance matrix .npy
+    """
+    return f'{os.path.splitext(arrays_path)[0]}.distance_matrix.npy'
+
+
+def saveBinaryInstance(instance, arrays_path, matrix_path):
+    """
+    Inputs: compiled instance, paths of the arrays .npz and of the matrix .npy
+            (cachePaths gives them for the cache, matrixPath otherwise)
+    Outputs: None, writes the files atomically so concurrent runs never
+             read a half written instance
+    """
+    os.makedirs(os.path.dirname(arrays_path), exist_ok=True)
+    # A lazy instance has no matrix to cache, only the arrays are written
+    if isinstance(instance.distance_matrix, numpy.ndarray):
+        _atomicSave(matrix_path, lambda file_object: numpy.save(
+            file_object, numpy.ascontiguousarray(instance.distance_matrix)))
+    _atomicSave(arrays_path, lambda file_object: numpy.savez(
+        file_object, header=numpy.array(json.dumps(instance.header())),
+        **{name: getattr(instance, name) for name in NODE_ARRAYS}))
+
+
+def loadBinaryInstance(arrays_path, matrix_path=None, mmap_mode='r', distance_mode='matrix', cache_rows=16):
+    """
+    Inputs: paths of the arrays .npz and of the matrix .npy (matrixPath of the
+            arrays if not given), mmap_mode of the distance matrix,
+            distance mode and LRU rows of the lazy mode
+    Outputs: VrpInstance, the distance matrix is memory mapped (read only);
+             in lazy mode the matrix file is not read at all, and without a
+             matrix file it is computed from the coordinates
+    """
+    matrix_path = matrix_path or matrixPath(arrays_path)
+    with numpy.load(arrays_path) as arrays:
+        header = json.loads(str(arrays['header']))
+        node_arrays = {name: arrays[name] for name in NODE_ARRAYS}
+    distance_matrix = None
+    if distance_mode == 'matrix' and os.path.exists(matrix_path):
+        distance_matrix = numpy.load(matrix_path, mmap_mode=mmap_mode)
+    distance_matrix = buildDistanceMatrix(distance_matrix, node_arrays['coordinates'],
+                                          distance_mode, cache_rows)
+    return VrpInstance.fromArrays(header, distance_matrix, **node_arrays)
+
+
+def loadCachedInstance(json_file, distance_mode='matrix', cache_rows=16):
+    """
+    Inputs: path to json file, distance mode and LRU rows of the lazy mode
+    Outputs: VrpInstance, read from the binary cache when there is one for
+             the current content of the file; otherwise the json is parsed
+             and the cache is written for the next runs.
+    """
+    source_hash = fileHash(json_file)
+    arrays_path, matrix_path = cachePaths(json_file, source_hash)
+    if os.path.exists(arrays_path) and (distance_mode == 'lazy' or os.path.exists(matrix_path)):
+        try:
+            return loadBinaryInstance(arrays_path, matrix_path, distance_mode=distance_mode,
+                                     cache_rows=cache_rows)
+        except (OSError, ValueError, KeyError) as error:
+            print(f"Ignoring unreadable instance cache {arrays_path}: {error}")
+
+    with io.open(json_file, 'rt', newline='') as file_object:
+        instance = compileInstance(json.load(file_object), distance_mode, cache_rows)
+    try:
+        saveBinaryInstance(instance, arrays_path, matrix_path)
+    except OSError as error:
+        print(f"Could not write instance cache {arrays_path}: {error}")
+    return instance
@@ -0,0 +1,231 @@
+import os
+import csv
+import random
+import contextlib
+import traceback
+import multiprocessing
+
+import numpy
+
+from nsga.NSGA2 import nsgaAlgo, BASE_DIR
+from nsga.cache import routeKey
+from nsga.selection import nondominatedFronts
+from nsga.results import OBJECTIVES
+from nsga.termination import StoppingCriteria
+
+
+# nsgaAlgo attributes every island copies from the template object
+ISLAND_ATTRIBUTES = ('pop_size', 'cross_prob', 'mut_prob', 'num_gen', 'batch_eval', 'incremental_eval',
+                     'decoder', 'engine', 'cache_size', 'dedup', 'seeding', 'seed_ratio', 'stagnation_window',
+                     'stagnation_metric', 'stagnation_tolerance', 'time_budget', 'eval_budget')
+
+
+def populationArrays(nsgaObj):
+    """
+    Inputs : nsgaAlgo object of an island, deap or array engine
+    Outputs: tuple of the 2d arrays of the routes and of the fitness values
+             of its population
+    """
+    if nsgaObj.engine == 'array':
+        return nsgaObj.pop, nsgaObj.fitness
+    return (numpy.array(nsgaObj.pop, dtype=numpy.int32),
+            numpy.array([ind.fitness.values for ind in nsgaObj.pop], dtype=numpy.float64))
+
+
+def selectEmigrants(routes, fitness, migrants):
+    """
+    Inputs : 2d arrays of the routes and fitness values of a population,
+             number of individuals that migrate
+    Outputs: tuple of the routes and fitness values of at most migrants
+             individuals drawn from the first front
+    """
+    front = nondominatedFronts(fitness, 1)[0].tolist()
+    chosen = sorted(random.sample(front, min(migrants, len(front))))
+    return routes[chosen].copy(), fitness[chosen].copy()
+
+
+def receiveImmigrants(nsgaObj, routes, fitness):
+    """
+    Inputs : nsgaAlgo object of an island, routes and fitness values of the
+             immigrants (already evaluated by the island they come from)
+    Outputs: None, the immigrants replace the last individuals of the
+             population (the worst ones, it is in the order of the NSGA-II
+             selection) and the selection is done again for the crowding
+             distances
+    """
+    if not len(routes):
+        return
+    if nsgaObj.engine == 'array':
+        pop, pop_fitness = nsgaObj.pop.copy(), nsgaObj.fitness.copy()
+        pop[-len(routes):], pop_fitness[-len(routes):] = routes, fitness
+        nsgaObj.selectRows(pop, pop_fitness, len(pop))
+        return
+    immigrants = []
+    for route, values in zip(routes.tolist(), fitness.tolist()):
+        ind = nsgaObj.individual_class(route)
+        ind.fitness.values = tuple(values)
+        immigrants.append(ind)
+    nsgaObj.pop = nsgaObj.toolbox.select(nsgaObj.pop[:-len(immigrants)] + immigrants, len(nsgaObj.pop))
+
+
+def runIsland(index, instance, attributes, connection, migration_interval, migrants, seed=None):
+    """
+    Inputs : index of the island, loaded instance, dict of nsgaAlgo
+             attributes, end of the pipe to the parent, generations between
+             migrations, individuals sent at each migration, seed of the
+             random states (a fresh seed if None)
+    Outputs: None. Runs the generations of the island in epochs of
+             migration_interval generations; after each epoch the emigrants
+             and the stop reason of the island (None to go on) are sent to
+             the parent, which answers with the immigrants, or with None when
+             an island stopped so they all stop there. The final population
+             and the stop reason are sent at the end, or the traceback if the
+             run fails.
+    """
+    try:
+        random.seed(seed)
+        numpy.random.seed(None if seed is None else seed % 2 ** 32)
+        nsgaObj = nsgaAlgo(instance=instance)
+        for attribute, value in attributes.items():
+            setattr(nsgaObj, attribute, value)
+        # The islands are the processes: no evaluation pool inside them
+        nsgaObj.workers = 1
+        num_gen = nsgaObj.num_gen
+        # The budgets and the window are those of each island, counted from
+        # its own start
+        if nsgaObj.stagnation_window or nsgaObj.time_budget or nsgaObj.eval_budget:
+            nsgaObj.stopping = StoppingCriteria(nsgaObj.stagnation_window, nsgaObj.stagnation_metric,
+                                                nsgaObj.stagnation_tolerance, nsgaObj.time_budget,
+                                                nsgaObj.eval_budget)
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            nsgaObj.registerOperators()
+            if nsgaObj.engine == 'array':
+                nsgaObj.generatingArrayPop()
+            else:
+                nsgaObj.generatingPopFitness()
+            # The epochs are counted apart from the generations done, so an
+            # island that stopped early still meets the others at the
+            # migration that ends its epoch
+            epoch_end = 0
+            while epoch_end < num_gen:
+                epoch_end = min(epoch_end + migration_interval, num_gen)
+                if nsgaObj.stop_reason is None:
+                    nsgaObj.num_gen = epoch_end
+                    if nsgaObj.engine == 'array':
+                        nsgaObj.runArrayGenerations()
+                    else:
+                        nsgaObj.runGenerations()
+                    nsgaObj.start_gen = nsgaObj.logbook[-1]['Generation']
+                if epoch_end >= num_gen:
+                    break
+                connection.send(('migrants', epoch_end,
+                                 (selectEmigrants(*populationArrays(nsgaObj), migrants), nsgaObj.stop_reason)))
+                immigrants = connection.recv()
+                if immigrants is None:
+                    break
+                receiveImmigrants(nsgaObj, *immigrants)
+        connection.send(('done', nsgaObj.start_gen, (populationArrays(nsgaObj), nsgaObj.stop_reason)))
+    except BaseException:
+        connection.send(('error', index, traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def _receive(connection):
+    kind, generation, payload = connection.recv()
+    if kind == 'error':
+        raise RuntimeError(f"island {generation} failed:\n{payload}")
+    return kind, generation, payload
+
+
+def paretoFront(routes, fitness):
+    """
+    Inputs : 2d arrays of routes and fitness values
+    Outputs: tuple of the routes and fitness values of the first front, one
+             copy of each route, sorted by the objectives
+    """
+    front = nondominatedFronts(fitness, 1)[0]
+    unique = {}
+    for index in front.tolist():
+        unique.setdefault(routeKey(routes[index]), index)
+    chosen = numpy.array(sorted(unique.values()), dtype=numpy.intp)
+    chosen = chosen[numpy.lexsort(fitness[chosen].T[::-1])]
+    return routes[chosen], fitness[chosen]
+
+
+def runIslands(nsgaObj, islands=4, migration_interval=10, migrants=2, seed=None):
+    """
+    Inputs : nsgaObj - nsgaAlgo object whose parameters (ISLAND_ATTRIBUTES)
+                       every island uses, pop_size is the size of each island
+             islands - number of sub-populations, one process each
+             migration_interval - generations between migrations
+             migrants - non-dominated individuals each island sends
+             seed - the island i is seeded with seed + i, fresh seeds if None
+    Outputs: tuple of the routes and fitness values of the merged Pareto
+             front of the final populations; the stop reason of the first
+             island that stopped early, or None, goes to nsgaObj.stop_reason
+
+    The islands evolve apart and only meet at the migrations: each one
+    sends its emigrants to the parent through a pipe, and the parent hands
+    them to the next island of the ring (island i receives from i - 1).
+    The stopping criteria are checked by every island; once one of them
+    stops, all the islands stop at the next migration.
+    """
+    attributes = {attribute: getattr(nsgaObj, attribute) for attribute in ISLAND_ATTRIBUTES}
+    nsgaObj.stop_reason = None
+    connections, processes = [], []
+    try:
+        for index in range(islands):
+            parent_end, child_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=runIsland, args=(index, nsgaObj.json_instance, attributes, child_end, migration_interval,
+                                        migrants, None if seed is None else seed + index))
+            process.start()
+            child_end.close()
+            connections.append(parent_end)
+            processes.append(process)
+
+        while True:
+            messages = [_receive(connection) for connection in connections]
+            if messages[0][0] == 'done':
+                break
+            generation = messages[0][1]
+            best = [payload[0][1].min(axis=0) for _, _, payload in messages]
+            print(f"{20 * '#'} Migration after {generation} Generations {20 * '#'}")
+            for index, values in enumerate(best):
+                print(f"Island {index}: best " + ", ".join(f"{objective} {value:.2f}" for objective, value
+                                                           in zip(OBJECTIVES, values)))
+            stop_reasons = [(index, payload[1]) for index, (_, _, payload) in enumerate(messages)
+                            if payload[1] is not None]
+            if stop_reasons:
+                print(f"Island {stop_reasons[0][0]} stopped early ({stop_reasons[0][1]}), stopping all the islands")
+            for index, connection in enumerate(connections):
+                connection.send(None if stop_reasons else messages[index - 1][2][0])
+    finally:
+        for connection in connections:
+            connection.close()
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+    nsgaObj.stop_reason = next((payload[1] for _, _, payload in messages if payload[1] is not None), None)
+    routes = numpy.concatenate([payload[0][0] for _, _, payload in messages])
+    fitness = numpy.concatenate([payload[0][1] for _, _, payload in messages])
+    return paretoFront(routes, fitness)
+
+
+def exportFront(csv_file_name, routes, fitness):
+    """
+    Inputs : csv file name in results, routes and fitness values of a front
+    Outputs: path of the written csv, one row per route with its objectives
+    """
+    columns = list(OBJECTIVES[:fitness.shape[1]]) + ['Route']
+    csv_path = os.path.join(BASE_DIR, "results", csv_file_name)
+    with open(csv_path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(columns)
+        for route, values in zip(routes.tolist(), fitness.tolist()):
+            writer.writerow(values + [' '.join(map(str, route))])
+    return csv_path
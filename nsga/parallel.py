@@ -0,0 +1,155 @@
+import atexit
+import math
+import multiprocessing
+import signal
+from multiprocessing import shared_memory
+
+import numpy
+
+
+# Instance of the problem inside each worker process, set once by the
+# pool initializer so it is not pickled again with every task.
+_WORKER_INSTANCE = None
+# Shared memory block the worker distance matrix is a view of, it must
+# stay referenced while the view is used.
+_WORKER_SHARED_MEMORY = None
+
+
+class SharedDistanceMatrix(object):
+    """
+    Copy of the distance matrix in a multiprocessing.shared_memory block.
+    Workers attach to it by the descriptor (name, shape, dtype) and read
+    it zero-copy. The block is unlinked by unlink(), which is also
+    registered with atexit; if the process is killed the multiprocessing
+    resource tracker removes the leaked block.
+    """
+
+    def __init__(self, distance_matrix):
+        distance_matrix = numpy.ascontiguousarray(distance_matrix)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, distance_matrix.nbytes))
+        self.array = numpy.ndarray(distance_matrix.shape, dtype=distance_matrix.dtype,
+                                   buffer=self.shm.buf)
+        self.array[...] = distance_matrix
+        self.descriptor = (self.shm.name, distance_matrix.shape, distance_matrix.dtype.str)
+        atexit.register(self.unlink)
+
+    def unlink(self):
+        if self.shm is None:
+            return
+        atexit.unregister(self.unlink)
+        # The view must be released before the block is closed
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+def attachDistanceMatrix(descriptor):
+    """
+    Inputs : descriptor (name, shape, dtype) of a SharedDistanceMatrix
+    Outputs: tuple of the attached SharedMemory and the array view over it
+    """
+    name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, numpy.ndarray(shape, dtype=numpy.dtype(dtype), buffer=shm.buf)
+
+
+def _initWorker(instance, matrix_descriptor=None):
+    global _WORKER_INSTANCE, _WORKER_SHARED_MEMORY
+    # Ctrl-C is handled by the parent, which terminates the pool; a worker
+    # dying on it could leave the pool queues locked.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if matrix_descriptor is not None:
+        _WORKER_SHARED_MEMORY, distance_matrix = attachDistanceMatrix(matrix_descriptor)
+        instance = instance.withDistanceMatrix(distance_matrix)
+    _WORKER_INSTANCE = instance
+
+
+def workerEvaluate(individual, evaluate, **kwargs):
+    """
+    Inputs : individual route, evaluation function (eval_indvidual_fitness or
+             eval_population_fitness) and its remaining keyword arguments
+    Outputs: evaluate called with the instance loaded in this worker
+    """
+    return evaluate(individual, instance=_WORKER_INSTANCE, **kwargs)
+
+
+def chunkSize(num_tasks, workers, chunks_per_worker=4):
+    """
+    Inputs : number of tasks, number of worker processes
+    Outputs: chunksize that gives each worker a few chunks, so the work is
+             balanced without paying one round trip per individual
+    """
+    return max(1, math.ceil(num_tasks / (workers * chunks_per_worker)))
+
+
+class EvaluationPool(object):
+    """
+    Process pool for the fitness evaluation. The instance is shipped to the
+    workers once, when the pool starts, and the individuals are sent as
+    plain lists, so the workers do not depend on the deap creator classes.
+    With share_matrix the distance matrix is not shipped at all: it is put
+    in a SharedDistanceMatrix that every worker attaches to (a lazy distance
+    matrix holds only the coordinates and is shipped as it is).
+    """
+
+    def __init__(self, instance, workers, share_matrix=True):
+        self.workers = workers
+        self.shared_matrix = None
+        initargs = (instance,)
+        if share_matrix and isinstance(instance.distance_matrix, numpy.ndarray):
+            self.shared_matrix = SharedDistanceMatrix(instance.distance_matrix)
+            initargs = (instance.withDistanceMatrix(None), self.shared_matrix.descriptor)
+        try:
+            self.pool = multiprocessing.Pool(processes=workers, initializer=_initWorker,
+                                             initargs=initargs)
+        except BaseException:
+            self.releaseSharedMatrix()
+            raise
+
+    def map(self, func, individuals):
+        tasks = [list(ind) for ind in individuals]
+        return self.pool.map(func, tasks, chunksize=chunkSize(len(tasks), self.workers))
+
+    def mapBatches(self, func, individuals):
+        """
+        Inputs : batch evaluation function, individuals (or 2d array of
+                 routes)
+        Outputs: list of fitnesses, the individuals are split in one
+                 contiguous block per worker and each block is evaluated
+                 with func (already bound through workerEvaluate)
+        """
+        # The rows of an array population are sent as array blocks
+        tasks = individuals if isinstance(individuals, numpy.ndarray) else [list(ind) for ind in individuals]
+        if not len(tasks):
+            return []
+        block = math.ceil(len(tasks) / self.workers)
+        blocks = [tasks[start:start + block] for start in range(0, len(tasks), block)]
+        fitnesses = []
+        for block_fitnesses in self.pool.map(func, blocks, chunksize=1):
+            fitnesses.extend(block_fitnesses)
+        return fitnesses
+
+    def releaseSharedMatrix(self):
+        if self.shared_matrix is not None:
+            self.shared_matrix.unlink()
+            self.shared_matrix = None
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.releaseSharedMatrix()
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.releaseSharedMatrix()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
@@ -0,0 +1,265 @@
+import os
+import csv
+
+import numpy
+
+from nsga.instance import _atomicSave
+
+
+# Statistics of the logbook, one (Number of vehicles, Route cost) pair per
+# generation, (Number of vehicles, Route cost, Lateness) with time windows
+STAT_COLUMNS = ('avg', 'std', 'min', 'max')
+# Column names of resultsFrame, per statistic and objective
+FRAME_PREFIXES = {'avg': 'Avg', 'std': 'Std', 'min': 'Best', 'max': 'Max'}
+OBJECTIVES = ('Vehicles', 'Distance', 'Lateness')
+
+
+def logbookArrays(logbook):
+    """
+    Inputs : logbook of a run (recordStat records)
+    Outputs: dict of columnar arrays, one row per generation: Generation and
+             evals (int32), avg, std, min, max and fitness_best_one
+             (float64, one column per objective) and best_one (int32 matrix
+             of the best permutation of each generation)
+    """
+    arrays = {
+        'Generation': numpy.array([record['Generation'] for record in logbook], dtype=numpy.int32),
+        'evals': numpy.array([record['evals'] for record in logbook], dtype=numpy.int32),
+    }
+    for column in STAT_COLUMNS:
+        arrays[column] = numpy.array([record[column] for record in logbook], dtype=numpy.float64)
+    arrays['best_one'] = numpy.array([record['best_one'] for record in logbook], dtype=numpy.int32)
+    arrays['fitness_best_one'] = numpy.array([tuple(record['fitness_best_one'].values) for record in logbook],
+                                             dtype=numpy.float64)
+    return arrays
+
+
+def exportResults(npz_path, logbook, **run_arrays):
+    """
+    Inputs : path of the .npz, logbook of a run, more arrays of the run
+             (stop_reason)
+    Outputs: None, the logbookArrays are saved (atomically) to npz_path
+    """
+    arrays = logbookArrays(logbook)
+    arrays.update(run_arrays)
+    _atomicSave(npz_path, lambda file_object: numpy.savez(file_object, **arrays))
+
+
+def _parseArrayColumn(column, dtype):
+    """
+    Inputs : pandas column of stringified arrays ("[  24.44  3776.79]",
+             "[37, 39, 3]" or "(23.0, 3457.2)"), dtype of the result
+    Outputs: 2d array, one row per value
+    """
+    values = column.astype(str).str.replace(r'[\[\](),]', ' ', regex=True).str.split()
+    return numpy.array(values.tolist(), dtype=numpy.float64).astype(dtype)
+
+
+def readCsvResults(csv_path):
+    """
+    Inputs : path of a results csv written by exportCsv
+    Outputs: the same dict of arrays as logbookArrays, each column is parsed
+             at once instead of row by row
+    """
+    import pandas
+
+    data_frame = pandas.read_csv(csv_path)
+    arrays = {
+        'Generation': data_frame['Generation'].to_numpy(dtype=numpy.int32),
+        'evals': data_frame['evals'].to_numpy(dtype=numpy.int32),
+    }
+    for column in STAT_COLUMNS:
+        arrays[column] = _parseArrayColumn(data_frame[column], numpy.float64)
+    arrays['best_one'] = _parseArrayColumn(data_frame['best_one'], numpy.int32)
+    arrays['fitness_best_one'] = _parseArrayColumn(data_frame['fitness_best_one'], numpy.float64)
+    return arrays
+
+
+def partialPath(results_path):
+    """
+    Inputs : path of the results of a run (.csv or .npz)
+    Outputs: path of the binary records a ResultsWriter appends to while
+             the run is going
+    """
+    return f'{os.path.splitext(results_path)[0]}.partial'
+
+
+def rowDtype(size, num_objectives=2):
+    """
+    Inputs : individual size, number of objectives
+    Outputs: numpy dtype of one generation record of the partial file
+    """
+    objectives = ('<f8', (num_objectives,))
+    return numpy.dtype([('Generation', '<i4'), ('evals', '<i4')]
+                       + [(column, *objectives) for column in STAT_COLUMNS]
+                       + [('fitness_best_one', *objectives), ('best_one', '<i4', (size,))])
+
+
+def readPartialResults(partial_path):
+    """
+    Inputs : path of the partial file of a ResultsWriter
+    Outputs: dict of columnar arrays (see logbookArrays) of the generations
+             written so far; a record torn by a crash is dropped
+    """
+    with open(partial_path, 'rb') as partial_file:
+        size, num_objectives = numpy.frombuffer(partial_file.read(8), dtype='<i4')
+        data = partial_file.read()
+    dtype = rowDtype(int(size), int(num_objectives))
+    rows = numpy.frombuffer(data[:len(data) - len(data) % dtype.itemsize], dtype=dtype)
+    return {name: rows[name].copy() for name in dtype.names}
+
+
+class ResultsWriter(object):
+    """
+    Append-only sink of the generation records of a run. Each record is
+    written, and flushed, to the results csv (the exportCsv format) and to a
+    binary partial file, so the generations done are on disk if the run
+    dies. close() turns the partial file into the columnar .npz read by
+    loadResults; abort() closes the files and leaves the partial results.
+    """
+
+    def __init__(self, results_path, resume_offsets=None):
+        """
+        Inputs : results_path - path of the results csv (or .npz)
+                 resume_offsets - offsets of a checkpoint: the csv and the
+                                  partial file are cut to them and appended
+                                  to, instead of being started over
+        """
+        stem = os.path.splitext(results_path)[0]
+        self.csv_path = f'{stem}.csv'
+        self.npz_path = f'{stem}.npz'
+        self.partial_path = partialPath(results_path)
+        # The csv is rewritten, the .npz of an older run with the same name
+        # would be read instead of the new partial results
+        if os.path.exists(self.npz_path):
+            os.remove(self.npz_path)
+        self.csv_writer = None
+        self.dtype = None
+
+        if resume_offsets is None or not resume_offsets[0]:
+            self.csv_file = open(self.csv_path, 'w', newline='')
+            self.partial_file = open(self.partial_path, 'wb')
+            return
+
+        csv_offset, partial_offset = resume_offsets
+        os.truncate(self.csv_path, csv_offset)
+        os.truncate(self.partial_path, partial_offset)
+        with open(self.csv_path, newline='') as csv_file:
+            fieldnames = next(csv.reader(csv_file))
+        with open(self.partial_path, 'rb') as partial_file:
+            size, num_objectives = numpy.frombuffer(partial_file.read(8), dtype='<i4')
+        self.csv_file = open(self.csv_path, 'a', newline='')
+        self.partial_file = open(self.partial_path, 'ab')
+        self.csv_writer = csv.DictWriter(self.csv_file, fieldnames=fieldnames)
+        self.dtype = rowDtype(int(size), int(num_objectives))
+
+    def offsets(self):
+        """
+        Outputs: sizes of the csv and of the partial file written so far
+                 (the resume_offsets of a checkpoint taken now)
+        """
+        return (os.fstat(self.csv_file.fileno()).st_size, os.fstat(self.partial_file.fileno()).st_size)
+
+    def write(self, record):
+        """
+        Inputs : logbook record of a generation (see recordStat)
+        Outputs: None, the record is appended to the csv and the partial file
+        """
+        fitness_best_one = tuple(record['fitness_best_one'].values)
+        if self.csv_writer is None:
+            self.csv_writer = csv.DictWriter(self.csv_file, fieldnames=list(record.keys()))
+            self.csv_writer.writeheader()
+            self.dtype = rowDtype(len(record['best_one']), len(fitness_best_one))
+            self.partial_file.write(numpy.array([len(record['best_one']), len(fitness_best_one)],
+                                                dtype='<i4').tobytes())
+        self.csv_writer.writerow(record)
+
+        row = numpy.zeros(1, dtype=self.dtype)
+        for name in ('Generation', 'evals') + STAT_COLUMNS:
+            row[name] = record[name]
+        row['fitness_best_one'] = fitness_best_one
+        row['best_one'] = record['best_one']
+        self.partial_file.write(row.tobytes())
+
+        self.csv_file.flush()
+        self.partial_file.flush()
+
+    def abort(self):
+        if not self.csv_file.closed:
+            self.csv_file.close()
+            self.partial_file.close()
+
+    def close(self, **run_arrays):
+        """
+        Inputs : more arrays of the run saved in the .npz (stop_reason)
+        Outputs: path of the .npz written from the partial file, which is
+                 removed (None if no generation was written)
+        """
+        self.abort()
+        if self.dtype is None:
+            os.remove(self.partial_path)
+            return None
+        arrays = readPartialResults(self.partial_path)
+        arrays.update(run_arrays)
+        _atomicSave(self.npz_path, lambda file_object: numpy.savez(file_object, **arrays))
+        os.remove(self.partial_path)
+        return self.npz_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def loadResults(results_path):
+    """
+    Inputs : path of the results of a run, the .npz written by exportResults
+             or the .csv of exportCsv (its .npz is read instead if present)
+    Outputs: dict of columnar arrays (see logbookArrays). For a run that is
+             still going, or died, the partial file of its ResultsWriter is
+             read if there is no .npz yet
+    """
+    stem, extension = os.path.splitext(results_path)
+    npz_path = results_path if extension == '.npz' else f'{stem}.npz'
+    if os.path.exists(npz_path):
+        with numpy.load(npz_path) as npz_file:
+            return {name: npz_file[name] for name in npz_file.files}
+    if os.path.exists(partialPath(results_path)):
+        return readPartialResults(partialPath(results_path))
+    return readCsvResults(results_path)
+
+
+def resultsFrame(results):
+    """
+    Inputs : dict of arrays of loadResults
+    Outputs: pandas DataFrame with one row per generation and the numeric
+             columns Generation, Evals and Best_/Max_/Avg_/Std_ Vehicles and
+             Distance (and Lateness, with time windows)
+    """
+    import pandas
+
+    columns = {'Generation': results['Generation'], 'Evals': results['evals']}
+    for column, prefix in FRAME_PREFIXES.items():
+        for objective_index, objective in enumerate(OBJECTIVES[:results[column].shape[1]]):
+            columns[f'{prefix}_{objective}'] = results[column][:, objective_index]
+    return pandas.DataFrame(columns)
+
+
+def loadResultsFrame(results_path):
+    """
+    Inputs : path of the results of a run (see loadResults)
+    Outputs: resultsFrame of the run
+    """
+    return resultsFrame(loadResults(results_path))
+
+
+def bestSolution(results, generation=-1):
+    """
+    Inputs : dict of arrays of loadResults, generation row (last by default)
+    Outputs: best permutation of that generation as a list
+    """
+    return results['best_one'][generation].tolist()
@@ -0,0 +1,178 @@
+import itertools
+
+import numpy
+
+from nsga.cache import routeKey
+from nsga.checkpoint import loadCheckpoint
+from nsga.instance import compileInstance
+from nsga.results import loadResults
+
+
+# Constructive heuristics a population can be seeded with; any other
+# seeding source is the path of the results or checkpoint of a run
+HEURISTICS = ('nn', 'savings', 'sweep')
+
+
+def nearestNeighborTour(instance, first=None):
+    """
+    Inputs : compiled instance, first customer (the nearest to the depot
+             if None)
+    Outputs: permutation built by always going to the nearest customer not
+             yet visited, one distance row read per step
+    """
+    num_customers = len(instance.demand) - 1
+    visited = numpy.zeros(num_customers + 1, dtype=bool)
+    visited[0] = True
+    current = int(numpy.argmin(instance.distance_matrix[0][1:])) + 1 if first is None else int(first)
+    tour = [current]
+    visited[current] = True
+    for _ in range(num_customers - 1):
+        distances = numpy.where(visited, numpy.inf, instance.distance_matrix[current])
+        current = int(numpy.argmin(distances))
+        tour.append(current)
+        visited[current] = True
+    return tour
+
+
+def sweepTour(instance, offset=0.0):
+    """
+    Inputs : compiled instance, angle (radians) the sweep starts from
+    Outputs: permutation of the customers by their polar angle around the
+             depot, counted from offset, the closest first on ties; the
+             capacity split cuts it in to the sectors of the sweep heuristic
+    """
+    delta = instance.coordinates[1:] - instance.coordinates[0]
+    angles = numpy.mod(numpy.arctan2(delta[:, 1], delta[:, 0]) - offset, 2 * numpy.pi)
+    radius = numpy.hypot(delta[:, 0], delta[:, 1])
+    return (numpy.lexsort((radius, angles)) + 1).tolist()
+
+
+def savingsPairs(instance, neighbors=40):
+    """
+    Inputs : compiled instance, number of nearest customers paired with
+             each customer
+    Outputs: tuple of the arrays of the first and second customer index
+             (from 0) of the pairs the savings are computed for, first <
+             second: every pair, or only the pairs of each customer with
+             its nearest neighbors when there are more customers
+    """
+    num_customers = len(instance.demand) - 1
+    if num_customers - 1 <= neighbors:
+        return numpy.triu_indices(num_customers, k=1)
+    distances = instance.distance_matrix[1:, 1:]
+    nearest = numpy.argpartition(distances, neighbors, axis=1)[:, :neighbors + 1]
+    pairs = numpy.stack((numpy.repeat(numpy.arange(num_customers), neighbors + 1), nearest.ravel()), axis=1)
+    pairs = numpy.unique(numpy.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def savingsTour(instance, noise=0.0, neighbors=40):
+    """
+    Inputs : compiled instance, relative noise of the savings (0 gives the
+             Clarke-Wright routes, above 0 a randomized variant), nearest
+             customers paired with each one (see savingsPairs)
+    Outputs: permutation that chains the routes of the parallel savings
+             heuristic: the savings d(0,i) + d(0,j) - d(i,j) are computed
+             at once, and the routes whose ends are joined by the largest
+             ones are merged while the capacity allows it
+    """
+    num_customers = len(instance.demand) - 1
+    customers = numpy.arange(1, num_customers + 1)
+    from_depot = instance.distance_matrix[0, customers]
+    first, second = savingsPairs(instance, neighbors)
+    savings = from_depot[first] + from_depot[second] - instance.distance_matrix[first + 1, second + 1]
+    if noise:
+        savings = savings * numpy.random.uniform(1 - noise, 1 + noise, len(savings))
+    order = numpy.argsort(-savings, kind='stable')
+
+    # Route of each customer, its stops and load; a customer is an end of
+    # its route if it is the first or the last stop
+    route_of = list(range(num_customers + 1))
+    routes = {customer: [customer] for customer in customers.tolist()}
+    loads = {customer: instance.demand[customer] for customer in customers.tolist()}
+    for i, j in zip((first[order] + 1).tolist(), (second[order] + 1).tolist()):
+        route_i, route_j = route_of[i], route_of[j]
+        if route_i == route_j or loads[route_i] + loads[route_j] > instance.capacity:
+            continue
+        stops_i, stops_j = routes[route_i], routes[route_j]
+        if stops_i[-1] != i:
+            if stops_i[0] != i:
+                continue
+            stops_i.reverse()
+        if stops_j[0] != j:
+            if stops_j[-1] != j:
+                continue
+            stops_j.reverse()
+        stops_i.extend(stops_j)
+        loads[route_i] += loads.pop(route_j)
+        for customer in routes.pop(route_j):
+            route_of[customer] = route_i
+    return list(itertools.chain.from_iterable(routes.values()))
+
+
+def heuristicTours(instance, heuristic):
+    """
+    Inputs : compiled instance, name of a heuristic of HEURISTICS
+    Outputs: generator of its tours: the plain heuristic first, then
+             variants (nearest neighbor from random first customers, sweeps
+             from random angles, savings with 10% noise)
+    """
+    num_customers = len(instance.demand) - 1
+    if heuristic == 'nn':
+        yield nearestNeighborTour(instance)
+        for first in numpy.random.permutation(num_customers) + 1:
+            yield nearestNeighborTour(instance, first)
+    elif heuristic == 'sweep':
+        yield sweepTour(instance)
+        while True:
+            yield sweepTour(instance, numpy.random.uniform(0, 2 * numpy.pi))
+    elif heuristic == 'savings':
+        yield savingsTour(instance)
+        while True:
+            yield savingsTour(instance, noise=0.1)
+    else:
+        raise ValueError(f"unknown heuristic {heuristic}, expected one of {HEURISTICS}")
+
+
+def savedTours(results_path):
+    """
+    Inputs : path of the results (.csv / .npz) or of the checkpoint
+             (.checkpoint.npz) of a run
+    Outputs: list of its permutations, best first: the population of the
+             checkpoint in the order of the selection, or the best
+             individual of each generation from the last one
+    """
+    if results_path.endswith('.checkpoint.npz'):
+        return loadCheckpoint(results_path)['population'].tolist()
+    return loadResults(results_path)['best_one'][::-1].tolist()
+
+
+def seedRoutes(instance, sources, count):
+    """
+    Inputs : instance, seeding sources (HEURISTICS names or paths of saved
+             runs of the same instance), number of routes wanted
+    Outputs: list of at most count distinct permutations, taken from the
+             sources in turn so each one contributes. Raises ValueError if
+             a saved route is not a permutation of the instance customers
+    """
+    instance = compileInstance(instance)
+    num_customers = len(instance.demand) - 1
+    customers = numpy.arange(1, num_customers + 1)
+    # At most count tours of each heuristic, its variants may repeat
+    generators = [itertools.islice(heuristicTours(instance, source), count) if source in HEURISTICS
+                  else iter(savedTours(source)) for source in sources]
+    routes, seen = [], set()
+    while generators and len(routes) < count:
+        for generator in list(generators):
+            route = next(generator, None)
+            if route is None:
+                generators.remove(generator)
+                continue
+            if len(route) != num_customers or not numpy.array_equal(numpy.sort(route), customers):
+                raise ValueError(f"seeding route is not a permutation of the {num_customers} customers "
+                                 f"of {instance['instance_name']}")
+            key = routeKey(route)
+            if key not in seen and len(routes) < count:
+                seen.add(key)
+                routes.append(list(route))
+    return routes
@@ -0,0 +1,193 @@
+import bisect
+
+import numpy
+from deap import tools
+
+
+def nondominatedRanks(objectives):
+    """
+    Inputs : (N, 2) array of objectives to minimize
+    Outputs: int array with the front of each row (0 for the non-dominated
+             ones), the same fronts as deap's sortNondominated
+
+    Two-objective sort in O(N log N): in (f1, f2) order the rows before a
+    row are the only ones that can dominate it, and the last row added to
+    each front has the lowest f2 of that front, so a row goes to the first
+    front whose last f2 is greater than its own (found by bisection). A row
+    equal to the previous one goes to the same front, equal rows do not
+    dominate each other.
+    """
+    objectives = numpy.asarray(objectives, dtype=numpy.float64)
+    ranks = numpy.empty(len(objectives), dtype=numpy.int64)
+    if not len(objectives):
+        return ranks
+
+    order = numpy.lexsort((objectives[:, 1], objectives[:, 0]))
+    sorted_objectives = objectives[order].tolist()
+    front_last_f2 = []
+    previous, previous_rank = None, 0
+    for index, point in zip(order.tolist(), sorted_objectives):
+        if point == previous:
+            rank = previous_rank
+        else:
+            rank = bisect.bisect_right(front_last_f2, point[1])
+            if rank == len(front_last_f2):
+                front_last_f2.append(point[1])
+            else:
+                front_last_f2[rank] = point[1]
+        ranks[index] = rank
+        previous, previous_rank = point, rank
+    return ranks
+
+
+def dominanceFronts(objectives, k=None):
+    """
+    Inputs : (N, M) array of objectives to minimize, number of rows the
+             fronts must hold (all by default)
+    Outputs: list of index arrays of the fronts, each one in row order,
+             peeled from the N x N dominance matrix: for more than two
+             objectives, where nondominatedRanks does not apply
+    """
+    objectives = numpy.asarray(objectives, dtype=numpy.float64)
+    k = len(objectives) if k is None else min(k, len(objectives))
+    # dominates[i, j]: row i dominates row j
+    dominates = (objectives[:, None] <= objectives[None]).all(axis=2) & \
+                (objectives[:, None] < objectives[None]).any(axis=2)
+    num_dominators = dominates.sum(axis=0)
+    fronts = []
+    num_sorted = 0
+    front = numpy.flatnonzero(num_dominators == 0)
+    while num_sorted < k and len(front):
+        fronts.append(front)
+        num_sorted += len(front)
+        num_dominators -= dominates[front].sum(axis=0)
+        num_dominators[front] = -1
+        front = numpy.flatnonzero(num_dominators == 0)
+    return fronts
+
+
+def nondominatedFronts(objectives, k=None):
+    """
+    Inputs : (N, 2) array of objectives to minimize, number of rows the
+             fronts must hold (all by default)
+    Outputs: list of index arrays, the fronts listed in the same order as
+             deap's sortNondominated lists them (and stopping at the same
+             front), so a selection on them picks the same individuals.
+             Other numbers of objectives go to dominanceFronts.
+
+    sortNondominated groups the rows with equal objectives at their first
+    occurrence and lists the first front in that order. A row of the next
+    front is added when its last dominator of the previous front, in that
+    front's order, is reached, and rows reached together keep their order
+    of first occurrence. In two objectives a front sorted by f1 has f2
+    decreasing, so the dominators of a row in it are one contiguous range
+    and the last one is a range maximum of their positions.
+    """
+    objectives = numpy.asarray(objectives, dtype=numpy.float64)
+    num_rows = len(objectives)
+    k = num_rows if k is None else min(k, num_rows)
+    if k <= 0:
+        return []
+    if objectives.shape[1] != 2:
+        return dominanceFronts(objectives, k)
+
+    # Distinct objectives in order of first occurrence and their rows
+    groups = {}
+    for index, point in enumerate(map(tuple, objectives.tolist())):
+        groups.setdefault(point, []).append(index)
+    distinct = numpy.array(list(groups.keys()), dtype=numpy.float64).reshape(-1, 2)
+    group_rows = list(groups.values())
+    ranks = nondominatedRanks(distinct)
+
+    fronts = []
+    front = numpy.flatnonzero(ranks == 0)
+    num_sorted = 0
+    while True:
+        rows = [row for group in front.tolist() for row in group_rows[group]]
+        fronts.append(numpy.array(rows, dtype=numpy.int64))
+        num_sorted += len(rows)
+        next_front = numpy.flatnonzero(ranks == len(fronts))
+        if num_sorted >= k or not len(next_front):
+            return fronts
+
+        # Staircase of the front: f1 increasing and f2 decreasing
+        stair = front[numpy.argsort(distinct[front, 0])]
+        positions = numpy.empty(len(distinct), dtype=numpy.int64)
+        positions[front] = numpy.arange(len(front))
+        points = distinct[next_front]
+        stop = numpy.searchsorted(distinct[stair, 0], points[:, 0], side='right')
+        start = numpy.searchsorted(-distinct[stair, 1], -points[:, 1], side='left')
+        bounds = numpy.empty(2 * len(next_front), dtype=numpy.int64)
+        bounds[0::2], bounds[1::2] = start, stop
+        last_dominator = numpy.maximum.reduceat(numpy.append(positions[stair], -1), bounds)[0::2]
+        front = next_front[numpy.lexsort((next_front, last_dominator))]
+
+
+def crowdingDistances(values, front):
+    """
+    Inputs : (N, M) array of objective values, indices of the rows of one
+             front (in front order)
+    Outputs: crowding distance of each row of the front, as deap's
+             assignCrowdingDist computes it for the front in that order
+    """
+    front_values = values[front]
+    distances = numpy.zeros(len(front), dtype=numpy.float64)
+    num_objectives = front_values.shape[1]
+    for objective in range(num_objectives):
+        order = numpy.argsort(front_values[:, objective], kind='stable')
+        objective_values = front_values[order, objective]
+        distances[order[0]] = numpy.inf
+        distances[order[-1]] = numpy.inf
+        if objective_values[-1] == objective_values[0]:
+            continue
+        norm = num_objectives * float(objective_values[-1] - objective_values[0])
+        distances[order[1:-1]] += (objective_values[2:] - objective_values[:-2]) / norm
+    return distances
+
+
+def selectNSGA2Indices(objectives, values, k):
+    """
+    Inputs : objectives - (N, M) array of objectives to minimize (fronts)
+             values - (N, M) array of objective values (crowding distances)
+             k - number of rows to select
+    Outputs: tuple of the indices of the k selected rows, in the order
+             selNSGA2 returns them, and the crowding distance of every row
+             of the fronts that were sorted (nan for the other rows)
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    fronts = nondominatedFronts(objectives, k)
+    crowding = numpy.full(len(values), numpy.nan)
+    for front in fronts:
+        crowding[front] = crowdingDistances(values, front)
+    if not fronts:
+        return numpy.zeros(0, dtype=numpy.int64), crowding
+
+    chosen = numpy.concatenate(fronts[:-1] + [numpy.zeros(0, dtype=numpy.int64)])
+    # Last front, the least crowded rows first (stable, like sorted)
+    last_front = fronts[-1][numpy.argsort(-crowding[fronts[-1]], kind='stable')]
+    return numpy.concatenate((chosen, last_front[:max(0, k - len(chosen))])), crowding
+
+
+def selNSGA2Bi(individuals, k):
+    """
+    Inputs : individuals, number of individuals to select
+    Outputs: list of k selected individuals, the NSGA-II selection of
+             tools.selNSGA2 with the two-objective sort of nondominatedRanks
+             and the crowding distances computed with numpy. The
+             crowding_dist of the sorted fronts is set as selNSGA2 does.
+             Problems with other than two objectives go to tools.selNSGA2.
+    """
+    if not individuals:
+        return []
+    if len(individuals[0].fitness.wvalues) != 2:
+        return tools.selNSGA2(individuals, k)
+
+    # wvalues are maximized, the sort minimizes; crowding uses the values
+    objectives = -numpy.array([ind.fitness.wvalues for ind in individuals], dtype=numpy.float64)
+    values = numpy.array([ind.fitness.values for ind in individuals], dtype=numpy.float64)
+    chosen, crowding = selectNSGA2Indices(objectives, values, k)
+
+    for ind, crowding_dist in zip(individuals, crowding.tolist()):
+        if crowding_dist == crowding_dist:
+            ind.fitness.crowding_dist = crowding_dist
+    return [individuals[index] for index in chosen.tolist()]
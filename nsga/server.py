@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import random
+import asyncio
+import itertools
+import threading
+import contextlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from nsga.NSGA2 import nsgaAlgo, load_instance
+from nsga.instance import fileHash, DISTANCE_MODES
+from nsga.split import DECODERS
+from nsga.termination import STAGNATION_METRICS
+
+
+# nsgaAlgo attributes a job may set in the options of its config (the
+# runAlgorithm.py options; the jobs are the processes, so no workers)
+JOB_OPTIONS = ('batch_eval', 'incremental_eval', 'decoder', 'engine', 'cache_size', 'dedup', 'seeding',
+               'seed_ratio', 'stagnation_window', 'stagnation_metric', 'stagnation_tolerance', 'time_budget',
+               'eval_budget', 'distance_mode')
+
+# Worker process state, set once by the pool initializer: the queue the
+# progress records go to and the instances loaded in the worker, by
+# (file hash, distance mode), the least recently used one evicted first
+_WORKER_PROGRESS = None
+_WORKER_INSTANCES = OrderedDict()
+_WORKER_CACHE_SIZE = 4
+
+
+def _initWorker(progress_queue, cache_size):
+    global _WORKER_PROGRESS, _WORKER_CACHE_SIZE
+    _WORKER_PROGRESS = progress_queue
+    _WORKER_CACHE_SIZE = cache_size
+
+
+def workerInstance(instance_path, source_hash, distance_mode='matrix'):
+    """
+    Inputs : path of the instance, hash of its content, distance mode
+    Outputs: tuple of the VrpInstance, from the cache of this worker when
+             the same content was loaded before, and True if it was cached
+    """
+    key = (source_hash, distance_mode)
+    instance = _WORKER_INSTANCES.get(key)
+    if instance is not None:
+        _WORKER_INSTANCES.move_to_end(key)
+        return instance, True
+    instance = load_instance(instance_path, distance_mode=distance_mode)
+    if instance is None:
+        raise FileNotFoundError(f"instance {instance_path} not found")
+    _WORKER_INSTANCES[key] = instance
+    while len(_WORKER_INSTANCES) > _WORKER_CACHE_SIZE:
+        _WORKER_INSTANCES.popitem(last=False)
+    return instance, False
+
+
+class ProgressWriter(object):
+    """
+    ResultsWriter of a job that also puts a short record of each
+    generation in the progress queue of the server; everything else goes
+    to the ResultsWriter.
+    """
+
+    def __init__(self, results_writer, job_id):
+        self.results_writer = results_writer
+        self.job_id = job_id
+
+    def write(self, record):
+        self.results_writer.write(record)
+        _WORKER_PROGRESS.put((self.job_id, {
+            'type': 'progress', 'job': self.job_id, 'generation': int(record['Generation']),
+            'evals': int(record['evals']), 'min': record['min'].tolist(), 'avg': record['avg'].tolist()}))
+
+    def __getattr__(self, name):
+        return getattr(self.results_writer, name)
+
+
+class JobAlgo(nsgaAlgo):
+    """
+    nsgaAlgo of a server job: the results get the job id in their name, so
+    jobs with the same parameters do not write the same files, and every
+    generation is streamed to the server.
+    """
+
+    def __init__(self, job_id, instance):
+        self.job_id = job_id
+        super().__init__(instance=instance)
+
+    def resultsName(self):
+        return f"{super().resultsName()}_job{self.job_id}"
+
+    def openResults(self):
+        super().openResults()
+        self.results_writer = ProgressWriter(self.results_writer, self.job_id)
+
+
+def runJob(job_id, instance_path, source_hash, config):
+    """
+    Inputs : job id, path and content hash of the instance, config dict
+             (pop, cross, mut and gen, nsgaAlgo defaults if missing, seed
+             of the random states, fresh if missing, and options, see
+             JOB_OPTIONS)
+    Outputs: dict of the result of the run: best route and its fitness,
+             results file prefix, why it stopped, time and whether the
+             instance was cached.
+             It also goes through the progress queue, after the records
+             of the generations
+    """
+    # The workers are forked with the random states of the server, each job
+    # starts from its own seed so concurrent jobs do not repeat each other
+    seed = config.get('seed')
+    random.seed(seed)
+    numpy.random.seed(seed)
+    options = dict(config.get('options', {}))
+    instance, cached = workerInstance(instance_path, source_hash, options.pop('distance_mode', 'matrix'))
+    nsgaObj = JobAlgo(job_id, instance)
+    for key, attribute in (('pop', 'pop_size'), ('cross', 'cross_prob'), ('mut', 'mut_prob'), ('gen', 'num_gen')):
+        if key in config:
+            setattr(nsgaObj, attribute, config[key])
+    for attribute, value in options.items():
+        setattr(nsgaObj, attribute, value)
+
+    start_time = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        nsgaObj.runMain()
+    result = {'type': 'done', 'job': job_id, 'best_route': list(nsgaObj.best_individual),
+              'fitness': list(nsgaObj.best_individual.fitness.values), 'results': nsgaObj.resultsName(),
+              'stop_reason': nsgaObj.stop_reason or 'max_generations',
+              'execution_time_s': round(time.perf_counter() - start_time, 3), 'instance_cached': cached}
+    _WORKER_PROGRESS.put((job_id, result))
+    return result
+
+
+def _isInteger(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _isNumber(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# Allowed values of the enumerated options (the runAlgorithm.py choices)
+# and the checks of the other keys and options, with what they expect
+OPTION_CHOICES = {'decoder': DECODERS, 'engine': ('deap', 'array'), 'dedup': ('none', 'perturb', 'random'),
+                  'stagnation_metric': STAGNATION_METRICS, 'distance_mode': DISTANCE_MODES}
+VALUE_CHECKS = {
+    'pop': (lambda value: _isInteger(value) and value > 0 and value % 4 == 0, "a positive multiple of 4"),
+    'cross': (lambda value: _isNumber(value) and 0 <= value <= 1, "a number from 0 to 1"),
+    'mut': (lambda value: _isNumber(value) and 0 <= value <= 1, "a number from 0 to 1"),
+    'gen': (lambda value: _isInteger(value) and value >= 0, "a non-negative integer"),
+    'options.batch_eval': (lambda value: isinstance(value, bool), "a boolean"),
+    'options.incremental_eval': (lambda value: isinstance(value, bool), "a boolean"),
+    'options.cache_size': (lambda value: _isInteger(value) and value >= 0, "a non-negative integer"),
+    'options.seeding': (lambda value: isinstance(value, list) and all(isinstance(source, str) for source in value),
+                        "a list of heuristic names or paths"),
+    'options.seed_ratio': (lambda value: _isNumber(value) and 0 <= value <= 1, "a number from 0 to 1"),
+    'options.stagnation_window': (lambda value: _isInteger(value) and value >= 0, "a non-negative integer"),
+    'options.stagnation_tolerance': (lambda value: _isNumber(value) and value >= 0, "a non-negative number"),
+    'options.time_budget': (lambda value: _isNumber(value) and value >= 0, "a non-negative number"),
+    'options.eval_budget': (lambda value: _isInteger(value) and value >= 0, "a non-negative integer"),
+}
+
+
+def validateConfig(config):
+    """
+    Inputs : config of a submitted job
+    Outputs: None, raises ValueError if it is not an object, has unknown
+             keys or options, a seed that is not an integer in the range
+             numpy accepts, an option outside OPTION_CHOICES or a value
+             that fails VALUE_CHECKS
+    """
+    if not isinstance(config, dict):
+        raise ValueError("config must be an object")
+    if not isinstance(config.get('options', {}), dict):
+        raise ValueError("config options must be an object")
+    seed = config.get('seed')
+    if seed is not None and not (_isInteger(seed) and 0 <= seed < 2 ** 32):
+        raise ValueError(f"seed must be an integer from 0 to 2**32 - 1, not {seed!r}")
+    unknown = set(config) - {'pop', 'cross', 'mut', 'gen', 'seed', 'options'}
+    unknown |= {f"options.{option}" for option in set(config.get('options', {})) - set(JOB_OPTIONS)}
+    if unknown:
+        raise ValueError(f"unknown config keys {sorted(unknown)}")
+    options = config.get('options', {})
+    values = dict(config)
+    values.update((f"options.{option}", value) for option, value in options.items())
+    invalid = [f"options.{option} must be one of {choices}, not {options[option]!r}"
+               for option, choices in OPTION_CHOICES.items() if option in options and options[option] not in choices]
+    invalid += [f"{key} must be {expected}, not {values[key]!r}"
+                for key, (check, expected) in VALUE_CHECKS.items() if key in values and not check(values[key])]
+    if invalid:
+        raise ValueError(f"invalid config values: {'; '.join(invalid)}")
+
+
+class JobServer(object):
+    """
+    Local job server: clients connect over TCP or a unix socket and send
+    JSON lines. {"type": "submit", "instance": path, "config": {...},
+    "priority": n} queues a run (lower priority first, then in order of
+    arrival) and the connection receives the accepted, progress (one per
+    generation) and done or error lines of the job. The config may hold
+    the seed of the run, otherwise every job gets a fresh one.
+    {"type": "status"} answers the number of queued and running jobs.
+
+    The runs go to a pool of workers processes that stays up, so the
+    imports are paid once, and each worker keeps the last cache_size
+    instances it loaded, by the hash of their file. At most max_queued
+    jobs wait in the queue.
+    """
+
+    def __init__(self, workers=2, max_queued=100, cache_size=4):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.cache_size = cache_size
+        self.queue = None
+        self.sequence = itertools.count()
+        self.job_ids = itertools.count(1)
+        # Connection writer of each job still queued or running
+        self.subscribers = {}
+        self.running = 0
+
+    async def send(self, writer, message):
+        if writer.is_closing():
+            return
+        writer.write((json.dumps(message) + '\n').encode())
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def publish(self, job_id, message):
+        writer = self.subscribers.get(job_id)
+        if message['type'] in ('done', 'error'):
+            self.subscribers.pop(job_id, None)
+        if writer is not None:
+            asyncio.ensure_future(self.send(writer, message))
+
+    def readProgress(self, progress_queue, loop):
+        # Runs in a thread: the progress records of the workers are handed
+        # to the event loop, None stops it
+        for item in iter(progress_queue.get, None):
+            loop.call_soon_threadsafe(self.publish, *item)
+
+    async def submit(self, request, writer):
+        """
+        Inputs : submit request, writer of the connection
+        Outputs: None, the job is queued and the connection is answered
+        """
+        instance_path = request.get('instance')
+        config = request.get('config', {})
+        validateConfig(config)
+        priority = request.get('priority', 0)
+        if not _isInteger(priority):
+            raise ValueError(f"priority must be an integer, not {priority!r}")
+        if not isinstance(instance_path, str) or not os.path.exists(instance_path):
+            raise ValueError(f"instance {instance_path} not found")
+        if self.queue.qsize() >= self.max_queued:
+            raise ValueError(f"queue is full ({self.max_queued} jobs)")
+
+        loop = asyncio.get_running_loop()
+        source_hash = await loop.run_in_executor(None, fileHash, instance_path)
+        job_id = next(self.job_ids)
+        self.subscribers[job_id] = writer
+        await self.queue.put((priority, next(self.sequence), job_id,
+                              os.path.abspath(instance_path), source_hash, config))
+        await self.send(writer, {'type': 'accepted', 'job': job_id, 'queued': self.queue.qsize()})
+
+    async def handleClient(self, reader, writer):
+        try:
+            async for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be an object")
+                    if request.get('type') == 'submit':
+                        await self.submit(request, writer)
+                    elif request.get('type') == 'status':
+                        await self.send(writer, {'type': 'status', 'queued': self.queue.qsize(),
+                                                 'running': self.running, 'workers': self.workers})
+                    else:
+                        raise ValueError(f"unknown request type {request.get('type')}")
+                except (ValueError, TypeError, AttributeError) as error:
+                    await self.send(writer, {'type': 'error', 'error': str(error)})
+        except ConnectionError:
+            pass
+        finally:
+            # The jobs of the connection still run, their messages are dropped
+            for job_id in [job_id for job_id, job_writer in self.subscribers.items() if job_writer is writer]:
+                self.subscribers[job_id] = None
+            writer.close()
+
+    async def dispatch(self, executor):
+        # One dispatcher per worker, so at most workers jobs are running
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id, instance_path, source_hash, config = await self.queue.get()
+            self.running += 1
+            try:
+                # The done message comes through the progress queue, in
+                # order after the generations
+                await loop.run_in_executor(executor, runJob, job_id, instance_path, source_hash, config)
+            except Exception as error:
+                self.publish(job_id, {'type': 'error', 'job': job_id, 'error': f"{type(error).__name__}: {error}"})
+            finally:
+                self.running -= 1
+
+    async def serve(self, host='127.0.0.1', port=8765, socket_path=None):
+        """
+        Inputs : host and port of the TCP server, or path of a unix socket
+        Outputs: None, serves until cancelled
+        """
+        self.queue = asyncio.PriorityQueue()
+        loop = asyncio.get_running_loop()
+        progress_queue = multiprocessing.Queue()
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_initWorker,
+                                       initargs=(progress_queue, self.cache_size))
+        # The workers are started (forked) before the progress thread is
+        await loop.run_in_executor(executor, int)
+        threading.Thread(target=self.readProgress, args=(progress_queue, loop), daemon=True).start()
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handleClient, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handleClient, host, port)
+        dispatchers = [asyncio.ensure_future(self.dispatch(executor)) for _ in range(self.workers)]
+        try:
+            async with server:
+                print(f"Serving jobs on {socket_path or f'{host}:{port}'} with {self.workers} workers")
+                await server.serve_forever()
+        finally:
+            for dispatcher in dispatchers:
+                dispatcher.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            progress_queue.put(None)
+            if socket_path is not None and os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+async def submitJob(instance_path, config=None, priority=0, host='127.0.0.1', port=8765, socket_path=None):
+    """
+    Inputs : instance path, config and priority of the job, address of the
+             server (TCP host and port, or unix socket path)
+    Outputs: yields the messages of the job (accepted, progress, then done
+             or error) as they arrive
+    """
+    if socket_path is not None:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        request = {'type': 'submit', 'instance': instance_path, 'config': config or {}, 'priority': priority}
+        writer.write((json.dumps(request) + '\n').encode())
+        await writer.drain()
+        async for line in reader:
+            message = json.loads(line)
+            yield message
+            if message['type'] in ('done', 'error'):
+                break
+    finally:
+        writer.close()
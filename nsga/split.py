@@ -0,0 +1,209 @@
+import numpy
+
+from nsga.instance import compileInstance
+
+
+# Decoders of a permutation into vehicle routes: 'greedy' opens a vehicle
+# when the capacity is exceeded, 'split' is the Prins shortest path split
+# (lowest cost, the first one found on ties) and 'fleet' the shortest
+# path split with the fewest vehicles (lowest cost among them);
+# 'timewindows' is the split of nsga.timewindows, with the Lateness as a
+# third objective
+DECODERS = ('greedy', 'split', 'fleet', 'timewindows')
+
+
+def _tourArrays(individual, instance):
+    """
+    Inputs : individual route, compiled instance
+    Outputs: lists of the demand of each stop, the distance from the depot
+             to it, from it back to the depot and the prefix sums of the
+             edges of the giant tour (the distance from the first stop to
+             each stop, following the permutation)
+    """
+    stops = numpy.asarray(individual)
+    distance_matrix = instance.distance_matrix
+    edges = numpy.zeros(len(stops), dtype=numpy.float64)
+    numpy.cumsum(distance_matrix[stops[:-1], stops[1:]], out=edges[1:])
+    return (instance.demand[stops].tolist(), distance_matrix[0, stops].tolist(),
+            distance_matrix[stops, 0].tolist(), edges.tolist())
+
+
+def _splitLabels(individual, instance, fleet=False):
+    """
+    Inputs : individual route, compiled instance, fleet - minimize the
+             number of vehicles first
+    Outputs: lists of the cost, number of vehicles and start of the last
+             route of the best split of each prefix of the permutation
+             (prefix j is the first j stops)
+
+    Shortest path over the prefixes (Prins' Split): the route of the stops
+    i..j costs from_depot[i] + prefix[j] - prefix[i] + to_depot[j], each
+    start i is extended while the route fits in the capacity, so the work
+    is O(N k) for routes of at most k stops. A stop heavier than the
+    capacity gets a vehicle of its own, as routeToSubroute does.
+    """
+    demands, from_depot, to_depot, prefix = _tourArrays(individual, instance)
+    capacity = instance.capacity
+    size = len(demands)
+    cost = [0.0] + [float('inf')] * size
+    vehicles = [0] + [size + 1] * size
+    start = [0] * (size + 1)
+
+    for first in range(size):
+        base_cost = cost[first] + from_depot[first] - prefix[first]
+        base_vehicles = vehicles[first] + 1
+        load = 0
+        for last in range(first, size):
+            load += demands[last]
+            if load > capacity and last > first:
+                break
+            route_cost = base_cost + prefix[last] + to_depot[last]
+            if fleet:
+                better = base_vehicles < vehicles[last + 1] or \
+                    (base_vehicles == vehicles[last + 1] and route_cost < cost[last + 1])
+            else:
+                better = route_cost < cost[last + 1]
+            if better:
+                cost[last + 1], vehicles[last + 1], start[last + 1] = route_cost, base_vehicles, first
+    return cost, vehicles, start
+
+
+def eval_split_fitness(individual, instance, unit_cost, fleet=False):
+    """
+    Inputs: individual route as a sequence
+            Json object that is loaded as file object
+            unit_cost for the distance
+            fleet - fewest vehicles first ('fleet' decoder), else lowest
+                    cost ('split' decoder)
+    Outputs: Returns a tuple of (Number of vechicles, Route cost) of the
+             optimal split of the permutation
+    """
+    instance = compileInstance(instance)
+    cost, vehicles, _ = _splitLabels(individual, instance, fleet)
+    return (vehicles[-1], unit_cost * cost[-1])
+
+
+def splitSubroutes(individual, instance, fleet=False):
+    """
+    Inputs: Sequence of customers that a route has
+            Loaded instance problem
+            fleet - fewest vehicles first, else lowest cost
+    Outputs: Route divided in to the subroutes of the optimal split, like
+             routeToSubroute gives the greedy ones
+    """
+    instance = compileInstance(instance)
+    _, _, start = _splitLabels(individual, instance, fleet)
+    individual = list(individual)
+    route = []
+    last = len(individual)
+    while last > 0:
+        route.append(individual[start[last]:last])
+        last = start[last]
+    return route[::-1]
+
+
+def splitFront(individual, instance, unit_cost=1):
+    """
+    Inputs : individual route, loaded instance, unit cost of the distance
+    Outputs: list of the (Number of vehicles, Route cost) pairs of the
+             permutation that no other split dominates, by number of
+             vehicles: from the fewest vehicles ('fleet') to the lowest
+             cost ('split')
+
+    One layer of the shortest path per number of vehicles: the layer m
+    holds the lowest cost of each prefix split in m routes, computed from
+    the layer m - 1 over the window of starts that fit in the capacity.
+    """
+    instance = compileInstance(instance)
+    fewest, _ = eval_split_fitness(individual, instance, 1, fleet=True)
+    most, _ = eval_split_fitness(individual, instance, 1, fleet=False)
+
+    demands, from_depot, to_depot, prefix = map(numpy.asarray, _tourArrays(individual, instance))
+    size = len(demands)
+    cumulative = numpy.concatenate(([0.0], numpy.cumsum(demands)))
+    positions = numpy.arange(size)
+    # First start whose route up to each stop fits (the stop alone always does)
+    first_start = numpy.minimum(numpy.searchsorted(cumulative, cumulative[1:] - instance.capacity), positions)
+    window = int((positions - first_start).max()) + 1
+    starts = positions[:, None] - numpy.arange(window)
+    feasible = starts >= first_start[:, None]
+    starts = numpy.maximum(starts, 0)
+
+    front = []
+    layer = numpy.full(size + 1, numpy.inf)
+    layer[0] = 0.0
+    for num_vehicles in range(1, most + 1):
+        base = layer[:-1] + from_depot - prefix
+        candidates = numpy.where(feasible, base[starts], numpy.inf) + prefix[:, None] + to_depot[:, None]
+        layer = numpy.concatenate(([numpy.inf], candidates.min(axis=1)))
+        if num_vehicles >= fewest and (not front or layer[-1] < front[-1][1]):
+            front.append((num_vehicles, float(layer[-1])))
+    return [(num_vehicles, unit_cost * route_cost) for num_vehicles, route_cost in front]
+
+
+def eval_population_split_fitness(individuals, instance, unit_cost, fleet=False):
+    """
+    Inputs: sequence of individuals (or a 2-D permutation array, one row each)
+            Json object that is loaded as file object
+            unit_cost for the distance
+            fleet - fewest vehicles first, else lowest cost
+    Outputs: Returns a list with the (Number of vechicles, Route cost) tuple
+             of every individual, the same values eval_split_fitness gives.
+
+    The shortest path is walked once over the stop positions for the whole
+    population: the best split ending at a stop is the best of the window
+    of route starts that fit in the capacity, taken for all the rows at
+    once (the window of a stop covers the longest route that fits in any
+    row).
+    """
+    if len(individuals) == 0:
+        return []
+    instance = compileInstance(instance)
+    perms = numpy.asarray(individuals, dtype=numpy.intp)
+    distance_matrix = instance.distance_matrix
+    num_rows, size = perms.shape
+    rows = numpy.arange(num_rows)
+
+    demands = instance.demand[perms]
+    from_depot = distance_matrix[0, perms]
+    to_depot = distance_matrix[perms, 0]
+    prefix = numpy.zeros((num_rows, size), dtype=numpy.float64)
+    numpy.cumsum(distance_matrix[perms[:, :-1], perms[:, 1:]], axis=1, out=prefix[:, 1:])
+
+    # First start whose route up to each stop fits, found in one
+    # searchsorted by giving each row its own range of loads
+    cumulative = numpy.zeros((num_rows, size + 1), dtype=numpy.float64)
+    numpy.cumsum(demands, axis=1, out=cumulative[:, 1:])
+    offset = (cumulative[:, -1].max() + instance.capacity + 1) * rows[:, None]
+    first_start = numpy.searchsorted((cumulative + offset).ravel(),
+                                     (cumulative[:, 1:] - instance.capacity + offset).ravel())
+    first_start = first_start.reshape(num_rows, size) - (size + 1) * rows[:, None]
+    first_start = numpy.minimum(first_start, numpy.arange(size))
+    # Window of starts of each stop, the longest route that fits in any row
+    lowest_start = first_start.min(axis=0).tolist()
+
+    # base[i] is the cost of the best split of the first i stops plus the
+    # route to stop i, minus the prefix up to it
+    base = numpy.empty((num_rows, size), dtype=numpy.float64)
+    base_vehicles = numpy.empty((num_rows, size), dtype=numpy.int64)
+    base[:, 0] = from_depot[:, 0]
+    base_vehicles[:, 0] = 1
+    for last in range(size):
+        lowest = lowest_start[last]
+        feasible = numpy.arange(lowest, last + 1) >= first_start[:, last, None]
+        route_cost = numpy.where(feasible, base[:, lowest:last + 1], numpy.inf) \
+            + prefix[:, last, None] + to_depot[:, last, None]
+        if fleet:
+            # Lowest cost among the starts with the fewest vehicles
+            route_vehicles = numpy.where(feasible, base_vehicles[:, lowest:last + 1], size + 1)
+            fewest = route_vehicles.min(axis=1, keepdims=True)
+            route_cost[route_vehicles != fewest] = numpy.inf
+        # Ties go to the first start
+        best = route_cost.argmin(axis=1)
+        cost = route_cost[rows, best]
+        vehicles = base_vehicles[rows, lowest + best]
+        if last + 1 < size:
+            base[:, last + 1] = cost + from_depot[:, last + 1] - prefix[:, last + 1]
+            base_vehicles[:, last + 1] = vehicles + 1
+
+    return list(zip(vehicles.tolist(), (unit_cost * cost).tolist()))
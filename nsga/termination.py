@@ -0,0 +1,119 @@
+import time
+from collections import deque
+
+import numpy
+
+from nsga.selection import nondominatedFronts
+
+
+# What the stagnation is measured on: the lexicographically best fitness
+# (as tools.selBest picks it) or the hypervolume of the first front
+STAGNATION_METRICS = ('best', 'hypervolume')
+
+
+def frontHypervolume(fitness, reference):
+    """
+    Inputs : 2d array of fitness values (minimized), reference point
+    Outputs: hypervolume dominated by the first front and bounded by the
+             reference point; the points not better than it in every
+             objective add nothing. Two objectives are swept at once over
+             the front sorted by the first one, more go to moocore (the
+             hypervolume deap uses)
+    """
+    front = fitness[nondominatedFronts(fitness, 1)[0]]
+    front = numpy.unique(front[(front < reference).all(axis=1)], axis=0)
+    if not len(front):
+        return 0.0
+    if front.shape[1] == 2:
+        # Sorted by the first objective, the second one decreases
+        widths = numpy.diff(numpy.append(front[:, 0], reference[0]))
+        return float((widths * (reference[1] - front[:, 1])).sum())
+    import moocore
+    return float(moocore.hypervolume(front, ref=reference))
+
+
+def _improved(now, then, tolerance):
+    """
+    Inputs : best fitness tuples now and W generations before, relative
+             tolerance
+    Outputs: True if now is lexicographically better than then, an
+             objective counting only if it changed by more than tolerance
+    """
+    for value, previous in zip(now, then):
+        if value < previous - tolerance * abs(previous):
+            return True
+        if value > previous + tolerance * abs(previous):
+            return False
+    return False
+
+
+class StoppingCriteria(object):
+    """
+    Termination criteria checked after every generation, on top of the
+    number of generations: no improvement of the stagnation metric over
+    the last stagnation_window generations (0 disables it), a wall-clock
+    budget in seconds and a budget of fitness evaluations (0 disables
+    them). A generation is never cut in the middle, so the budgets can be
+    overrun by the generation that crosses them.
+    """
+
+    def __init__(self, stagnation_window=0, stagnation_metric='best', tolerance=0.0, time_budget=0,
+                 eval_budget=0):
+        if stagnation_metric not in STAGNATION_METRICS:
+            raise ValueError(f"unknown stagnation metric {stagnation_metric}, "
+                             f"expected one of {STAGNATION_METRICS}")
+        self.stagnation_window = stagnation_window
+        self.stagnation_metric = stagnation_metric
+        self.tolerance = tolerance
+        self.time_budget = time_budget
+        self.eval_budget = eval_budget
+        self.start()
+
+    def start(self):
+        """
+        Outputs: None, the clock, the evaluation count and the stagnation
+                 history start again
+        """
+        self.start_time = time.perf_counter()
+        self.evals = 0
+        self.history = deque(maxlen=self.stagnation_window + 1)
+        self.reference = None
+
+    def metric(self, fitness):
+        """
+        Inputs : 2d array of the fitness values of the population
+        Outputs: value of the stagnation metric, the reference point of the
+                 hypervolume is the worst value of each objective in the
+                 first population seen, plus 1 (as deap's hypervolume)
+        """
+        if self.stagnation_metric == 'best':
+            return tuple(fitness[numpy.lexsort(fitness.T[::-1])[0]].tolist())
+        if self.reference is None:
+            self.reference = fitness.max(axis=0) + 1
+        return frontHypervolume(fitness, self.reference)
+
+    def update(self, fitness, evals):
+        """
+        Inputs : 2d array of the fitness values of the population after a
+                 generation, number of evaluations of that generation
+        Outputs: reason to stop ('time_budget', 'eval_budget' or
+                 'stagnation_<metric>'), None to go on
+        """
+        self.evals += evals
+        if self.time_budget and time.perf_counter() - self.start_time >= self.time_budget:
+            return 'time_budget'
+        if self.eval_budget and self.evals >= self.eval_budget:
+            return 'eval_budget'
+        if not self.stagnation_window:
+            return None
+
+        self.history.append(self.metric(fitness))
+        if len(self.history) == self.history.maxlen:
+            now, then = self.history[-1], self.history[0]
+            if self.stagnation_metric == 'best':
+                improved = _improved(now, then, self.tolerance)
+            else:
+                improved = now > then + self.tolerance * abs(then)
+            if not improved:
+                return f'stagnation_{self.stagnation_metric}'
+        return None
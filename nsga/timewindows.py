@@ -0,0 +1,140 @@
+import numpy
+
+from nsga.instance import compileInstance
+
+
+def _timeWindowArrays(individual, instance):
+    """
+    Inputs : individual route, compiled instance
+    Outputs: lists, in the order of the permutation, of the demand, ready
+             time, due time and service time of each stop, the distance
+             from the depot to it and back, and of the edges between
+             consecutive stops (the travel times)
+    """
+    stops = numpy.asarray(individual)
+    distance_matrix = instance.distance_matrix
+    return (instance.demand[stops].tolist(), instance.ready_time[stops].tolist(),
+            instance.due_time[stops].tolist(), instance.service_time[stops].tolist(),
+            distance_matrix[0, stops].tolist(), distance_matrix[stops, 0].tolist(),
+            distance_matrix[stops[:-1], stops[1:]].tolist())
+
+
+def _timeWindowWalk(individual, instance):
+    """
+    Inputs : individual route, compiled instance
+    Outputs: tuple of the number of vehicles, distance, lateness and the
+             list of positions that start a new vehicle
+
+    The permutation is split in one pass, each stop is checked in O(1)
+    from the time the vehicle leaves the previous one: a new vehicle
+    leaves the depot when the load would exceed the capacity, or when the
+    stop would be reached after its due time and a vehicle leaving the
+    depot at its ready time would not be late. A vehicle waits for the
+    ready time of a stop; the lateness is the sum of the service starts
+    after the due times, the returns to the depot after its due time
+    included. Travel times are the distances.
+    """
+    demands, ready, due, service, from_depot, to_depot, edges = _timeWindowArrays(individual, instance)
+    capacity = instance.capacity
+    depot_ready, depot_due = float(instance.ready_time[0]), float(instance.due_time[0])
+
+    new_vehicles = [0]
+    load = demands[0]
+    distance = from_depot[0]
+    start = max(depot_ready + from_depot[0], ready[0])
+    lateness = max(0.0, start - due[0])
+    for position in range(1, len(demands)):
+        departure = start + service[position - 1]
+        arrival = departure + edges[position - 1]
+        fresh_arrival = depot_ready + from_depot[position]
+        if load + demands[position] > capacity or (arrival > due[position] and fresh_arrival <= due[position]):
+            lateness += max(0.0, departure + to_depot[position - 1] - depot_due)
+            distance += to_depot[position - 1] + from_depot[position]
+            new_vehicles.append(position)
+            load = demands[position]
+            arrival = fresh_arrival
+        else:
+            distance += edges[position - 1]
+            load += demands[position]
+        start = max(arrival, ready[position])
+        lateness += max(0.0, start - due[position])
+    lateness += max(0.0, start + service[-1] + to_depot[-1] - depot_due)
+    distance += to_depot[-1]
+    return len(new_vehicles), distance, lateness, new_vehicles
+
+
+def eval_time_window_fitness(individual, instance, unit_cost):
+    """
+    Inputs: individual route as a sequence
+            Json object that is loaded as file object
+            unit_cost for the distance
+    Outputs: Returns a tuple of (Number of vechicles, Route cost, Lateness)
+             of the split that respects the capacity and the time windows
+    """
+    instance = compileInstance(instance)
+    vehicles, distance, lateness, _ = _timeWindowWalk(individual, instance)
+    return (vehicles, unit_cost * distance, lateness)
+
+
+def timeWindowSubroutes(individual, instance):
+    """
+    Inputs: Sequence of customers that a route has
+            Loaded instance problem
+    Outputs: Route divided in to the subroutes of the time window split
+    """
+    instance = compileInstance(instance)
+    individual = list(individual)
+    _, _, _, new_vehicles = _timeWindowWalk(individual, instance)
+    return [individual[start:end] for start, end in zip(new_vehicles, new_vehicles[1:] + [len(individual)])]
+
+
+def eval_population_time_window_fitness(individuals, instance, unit_cost):
+    """
+    Inputs: sequence of individuals (or a 2-D permutation array, one row each)
+            Json object that is loaded as file object
+            unit_cost for the distance
+    Outputs: Returns a list with the (Number of vechicles, Route cost,
+             Lateness) tuple of every individual, the same values
+             eval_time_window_fitness gives, the positions walked once with
+             every step vectorized over the population
+    """
+    if len(individuals) == 0:
+        return []
+    instance = compileInstance(instance)
+    perms = numpy.asarray(individuals, dtype=numpy.intp)
+    distance_matrix = instance.distance_matrix
+    capacity = instance.capacity
+    depot_ready, depot_due = float(instance.ready_time[0]), float(instance.due_time[0])
+
+    demands = instance.demand[perms]
+    ready = instance.ready_time[perms]
+    due = instance.due_time[perms]
+    service = instance.service_time[perms]
+    from_depot = distance_matrix[0, perms]
+    to_depot = distance_matrix[perms, 0]
+    edges = distance_matrix[perms[:, :-1], perms[:, 1:]]
+
+    vehicles = numpy.ones(len(perms), dtype=numpy.int64)
+    load = demands[:, 0].copy()
+    distance = from_depot[:, 0].copy()
+    start = numpy.maximum(depot_ready + from_depot[:, 0], ready[:, 0])
+    lateness = numpy.maximum(0.0, start - due[:, 0])
+    for position in range(1, perms.shape[1]):
+        departure = start + service[:, position - 1]
+        arrival = departure + edges[:, position - 1]
+        fresh_arrival = depot_ready + from_depot[:, position]
+        new_vehicle = (load + demands[:, position] > capacity) | \
+                      ((arrival > due[:, position]) & (fresh_arrival <= due[:, position]))
+
+        lateness += numpy.where(new_vehicle,
+                                numpy.maximum(0.0, departure + to_depot[:, position - 1] - depot_due), 0.0)
+        distance += numpy.where(new_vehicle, to_depot[:, position - 1] + from_depot[:, position],
+                                edges[:, position - 1])
+        vehicles += new_vehicle
+        load = numpy.where(new_vehicle, demands[:, position], load + demands[:, position])
+        start = numpy.maximum(numpy.where(new_vehicle, fresh_arrival, arrival), ready[:, position])
+        lateness += numpy.maximum(0.0, start - due[:, position])
+    lateness += numpy.maximum(0.0, start + service[:, -1] + to_depot[:, -1] - depot_due)
+    distance += to_depot[:, -1]
+
+    return list(zip(vehicles.tolist(), (unit_cost * distance).tolist(), lateness.tolist()))
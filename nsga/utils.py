@@ -1,10 +1,19 @@
 import os
 import io
 import fnmatch
-from json import load, dump
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from json import load, dumps
+
+import numpy
+
+from nsga.instance import VrpInstance, euclideanDistanceMatrix, matrixPath, saveBinaryInstance, _atomicSave
 
 BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
+# Columns of the customer table of a Solomon / Gehring-Homberger text file
+TEXT_COLUMNS = ('id', 'x', 'y', 'demand', 'ready_time', 'due_time', 'service_time')
+
 
 def calculate_distance(customer1, customer2):
     # Calculate distance between customer1 and customer 2 given their
@@ -17,11 +26,14 @@ def calculate_distance(customer1, customer2):
             (customer1['coordinates']['y'] - customer2['coordinates']['y']) ** 2) ** 0.5
 
 
-def converttext2json():
+def converttext2json(include_matrix=True):
     """
-    Inputs : None
+    Inputs : include_matrix - False writes only the coordinates, for
+             instances loaded with distance_mode='lazy' (the O(N^2) matrix
+             does not fit for very large instances)
     Outputs: Reads the *.txt file in text directory and converts in to
-             *.json file in json directory.
+             *.json file in json directory (indent-4 json, as it always was;
+             convertTextDirectory writes the compact binary instances).
     """
     print(f'base directory is {BASE_DIR}')
     text_dir = os.path.join(BASE_DIR, 'data', 'text')
@@ -29,84 +41,139 @@ def converttext2json():
     print(f'text_dir is {text_dir}')
     print(f'json_dir is {json_dir}')
 
-    for text_file in map(lambda text_filename: os.path.join(text_dir, text_filename), \
-                         fnmatch.filter(os.listdir(text_dir), '*.txt')):
-        print(text_file)
-        json_data = {}
-        numCustomers = 0
-        with io.open(text_file, 'rt', newline='') as file_object:
-            for line_count, line in enumerate(file_object, start=1):
-                # print(f'line_count is {line_count}')
-                # print(f'line is {line}')
-
-                if line_count in [2, 3, 4, 6, 7, 8, 9]:
-                    pass
-
-                # Instance name details, input text file name
-                elif line_count == 1:
-                    json_data['instance_name'] = line.strip()
-
-                # Vehicle capacity and max vehicles details
-                elif line_count == 5:
-                    values = line.strip().split()
-                    json_data['max_vehicle_number'] = int(values[0])
-                    json_data['vehicle_capacity'] = float(values[1])
-
-                # Depot details
-                elif line_count == 10:
-                    # This is depot
-                    values = line.strip().split()
-                    json_data['depart'] = {
-                        'coordinates': {
-                            'x': float(values[1]),
-                            'y': float(values[2]),
-                        },
-                        'demand': float(values[3]),
-                        'ready_time': float(values[4]),
-                        'due_time': float(values[5]),
-                        'service_time': float(values[6]),
-                    }
-
-                # Customer details
-                else:
-                    # Rest all are customers
-                    # print(f'line_count is {line_count}')
-                    # print(f'line is {line}')
-                    # Adding customer to number of customers
-                    numCustomers += 1
-                    values = line.strip().split()
-                    json_data[f'customer_{values[0]}'] = {
-                        'coordinates': {
-                            'x': float(values[1]),
-                            'y': float(values[2]),
-                        },
-                        'demand': float(values[3]),
-                        'ready_time': float(values[4]),
-                        'due_time': float(values[5]),
-                        'service_time': float(values[6]),
-                    }
-
-        # print(f'Number of customers is {numCustomers}')
-        customers = ['depart'] + [f'customer_{x}' for x in range(1, numCustomers + 1)]
-        # print(customers)
-
-        # Writing the distance_matrix
-        json_data['distance_matrix'] = [[calculate_distance(json_data[customer1], \
-                                                            json_data[customer2]) for customer1 in customers] for
-                                        customer2 in customers]
-
-        # Writing the number of customers details
-        json_data['Number_of_customers'] = numCustomers
-
-        # Giving filename as instance name, which is input text file name
-        json_file_name = f"{json_data['instance_name']}.json"
-        json_file = os.path.join(json_dir, json_file_name)
-        print(f'Write to file: {json_file}')
-
-        # Writing the json file to disk and saving it under json_customize directory
-        with io.open(json_file, 'wt', newline='') as file_object:
-            dump(json_data, file_object, sort_keys=True, indent=4, separators=(',', ': '))
+    convertTextDirectory(text_dir, json_dir=json_dir, json_matrix=include_matrix, indent=4)
+
+
+def parseTextInstance(text_file):
+    """
+    Inputs : path to a Solomon format *.txt file
+    Outputs: tuple of (header dict, dict of node arrays), the customer table
+             is read with numpy in one call and the arrays are indexed by
+             customer number, 0 being the depot
+    """
+    with io.open(text_file, 'rt', newline='') as file_object:
+        lines = [file_object.readline() for _ in range(5)]
+        table = numpy.loadtxt(file_object, skiprows=4, ndmin=2)
+
+    vehicles = lines[4].split()
+    table = table[numpy.argsort(table[:, 0], kind='stable')]
+    columns = dict(zip(TEXT_COLUMNS, table[:, :len(TEXT_COLUMNS)].T))
+
+    header = {
+        'instance_name': lines[0].strip(),
+        'max_vehicle_number': int(vehicles[0]),
+        'vehicle_capacity': float(vehicles[1]),
+        'Number_of_customers': len(table) - 1,
+    }
+    node_arrays = {
+        'demand': numpy.ascontiguousarray(columns['demand']),
+        'coordinates': numpy.ascontiguousarray(numpy.column_stack((columns['x'], columns['y']))),
+        'ready_time': numpy.ascontiguousarray(columns['ready_time']),
+        'due_time': numpy.ascontiguousarray(columns['due_time']),
+        'service_time': numpy.ascontiguousarray(columns['service_time']),
+    }
+    return header, node_arrays
+
+
+def textInstanceName(text_file):
+    """
+    Inputs : path to a Solomon format *.txt file
+    Outputs: instance name of its first line
+    """
+    with io.open(text_file, 'rt', newline='') as file_object:
+        return file_object.readline().strip()
+
+
+def convertTextInstance(text_file, binary_dir=None, json_dir=None, json_matrix=False,
+                        binary_matrix=True, indent=None, name=None):
+    """
+    Inputs : text_file - path to a Solomon format *.txt file
+             binary_dir - directory of the binary instance (<name>.npz with the
+                          node arrays and <name>.distance_matrix.npy), None skips it
+             json_dir - directory of the json instance, None skips it
+             json_matrix - write the distance matrix in the json (slim json
+                           without it by default, use distance_mode='lazy' or
+                           let load_instance compute it)
+             binary_matrix - write the distance matrix .npy
+             indent - json indent, None writes compact json
+             name - name of the written files, the instance name by default
+    Outputs: list of written files. The distance matrix is computed with
+             numpy broadcasting in blocks of rows.
+    """
+    header, node_arrays = parseTextInstance(text_file)
+    name = name or header['instance_name']
+    distance_matrix = None
+    if (binary_dir and binary_matrix) or (json_dir and json_matrix):
+        distance_matrix = euclideanDistanceMatrix(node_arrays['coordinates'])
+    instance = VrpInstance.fromArrays(header, distance_matrix, **node_arrays)
+    written = []
+
+    if binary_dir:
+        os.makedirs(binary_dir, exist_ok=True)
+        arrays_path = os.path.join(binary_dir, f"{name}.npz")
+        saveBinaryInstance(instance, arrays_path, matrixPath(arrays_path))
+        written.append(arrays_path)
+
+    if json_dir:
+        os.makedirs(json_dir, exist_ok=True)
+        json_data = dict(instance)
+        json_data.pop('distance_matrix')
+        if json_matrix:
+            json_data['distance_matrix'] = distance_matrix.tolist()
+        json_file = os.path.join(json_dir, f"{name}.json")
+        separators = (',', ': ') if indent is not None else (',', ':')
+        json_text = dumps(json_data, sort_keys=True, indent=indent, separators=separators)
+        _atomicSave(json_file, lambda file_object: file_object.write(json_text.encode()))
+        written.append(json_file)
+
+    return written
+
+
+def convertTextDirectory(text_dir, binary_dir=None, json_dir=None, workers=None, **kwargs):
+    """
+    Inputs : directory with *.txt instances, output directories, number of
+             processes (None uses every core) and the convertTextInstance options
+    Outputs: list of written files, the instances are converted in parallel.
+             The files are named after the instance name, or after the text
+             file when several files declare the same instance name (they
+             would overwrite each other)
+    """
+    text_files = [os.path.join(text_dir, text_filename)
+                  for text_filename in sorted(fnmatch.filter(os.listdir(text_dir), '*.txt'))]
+    names = [textInstanceName(text_file) for text_file in text_files]
+    names = [os.path.splitext(os.path.basename(text_file))[0] if names.count(name) > 1 else name
+             for text_file, name in zip(text_files, names)]
+    repeated = sorted({name for name in names if names.count(name) > 1})
+    if repeated:
+        raise ValueError(f"text files of {text_dir} give the same output names {repeated}")
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(convertTextInstance, text_file, binary_dir, json_dir, name=name, **kwargs)
+                   for text_file, name in zip(text_files, names)]
+        for text_file, future in zip(text_files, futures):
+            files = future.result()
+            print(f'{text_file} -> {", ".join(files)}')
+            written.extend(files)
+    return written
 
 
 if __name__ == "__main__":
-    converttext2json()
+    parser = argparse.ArgumentParser(description="Converts the Solomon *.txt instances of data/text")
+    parser.add_argument('--text_dir', type=str, default=os.path.join(BASE_DIR, 'data', 'text'))
+    parser.add_argument('--binary_dir', type=str, default=os.path.join(BASE_DIR, 'data', 'binary'),
+                        help="Directory of the binary instances, '' to skip them")
+    parser.add_argument('--json_dir', type=str, default='',
+                        help="Directory of the slim json instances (no distance matrix), '' to skip them")
+    parser.add_argument('--no_matrix', action='store_true',
+                        help="Do not write the distance matrix .npy (instances used with --distanceMode lazy)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of processes, every core by default")
+    parser.add_argument('--legacy', action='store_true',
+                        help="Write the old indent-4 json files with the distance matrix in data/json")
+    args = parser.parse_args()
+
+    if args.legacy:
+        converttext2json()
+    else:
+        convertTextDirectory(args.text_dir, args.binary_dir or None, args.json_dir or None,
+                             workers=args.workers, binary_matrix=not args.no_matrix)
@@ -1,4 +1,5 @@
 from nsga.NSGA2 import *
+from nsga.islands import runIslands, exportFront
 import argparse
 
 def main():
@@ -14,20 +15,100 @@ def main():
                         help="Mutation Probabilty")
     parser.add_argument('--numGen', type=int, default=200, required=False,
                         help="Number of generations to run")
+    parser.add_argument('--distanceMode', type=str, default='matrix', choices=['matrix', 'lazy'],
+                        help="'matrix' precomputes all distances, 'lazy' keeps only the coordinates "
+                             "and computes distances on demand (very large instances)")
+    parser.add_argument('--distanceCacheRows', type=int, default=16, required=False,
+                        help="Distance rows kept in the LRU cache of the lazy mode")
+    parser.add_argument('--workers', type=int, default=1, required=False,
+                        help="Number of processes used to evaluate the fitness")
+    parser.add_argument('--batchEval', action='store_true',
+                        help="Evaluate the whole offspring at once with the vectorized evaluator")
+    parser.add_argument('--incrementalEval', action='store_true',
+                        help="Evaluate the offspring changed only by mutation from the parent's "
+                             "split state (single process)")
+    parser.add_argument('--decoder', type=str, default='greedy', choices=['greedy', 'split', 'fleet', 'timewindows'],
+                        help="Split of the permutation into routes: 'greedy' opens a vehicle when the capacity "
+                             "is exceeded, 'split' is the optimal (Prins) split of lowest cost, 'fleet' the "
+                             "optimal split with the fewest vehicles, 'timewindows' respects the capacity and the "
+                             "time windows and adds the lateness as a third objective (VRPTW)")
+    parser.add_argument('--cacheSize', type=int, default=0, required=False,
+                        help="Routes kept in the LRU fitness cache, repeated routes are not evaluated "
+                             "again (0 disables it)")
+    parser.add_argument('--dedup', type=str, default='none', choices=['none', 'perturb', 'random'],
+                        help="Replace the repeated routes of parents and offspring before the selection, "
+                             "by a perturbed copy (segment reversal) or a new random route")
+    parser.add_argument('--engine', type=str, default='deap', choices=['deap', 'array'],
+                        help="'deap' evolves a list of individuals, 'array' evolves the population as an "
+                             "int32 matrix with a fitness matrix, evaluated in batch")
+    parser.add_argument('--seeding', type=str, nargs='+', default=[],
+                        help="Seed the initial population with the 'nn' (nearest neighbor), 'savings' "
+                             "(Clarke-Wright) and 'sweep' heuristics and/or the best routes of the results "
+                             "(.csv/.npz) or checkpoint (.checkpoint.npz) of earlier runs of the instance")
+    parser.add_argument('--seedRatio', type=float, default=0.25, required=False,
+                        help="Largest fraction of the initial population that is seeded")
+    parser.add_argument('--stagnationWindow', type=int, default=0, required=False,
+                        help="Stop when the stagnation metric did not improve over this many generations "
+                             "(0 disables it)")
+    parser.add_argument('--stagnationMetric', type=str, default='best', choices=['best', 'hypervolume'],
+                        help="'best' is the lexicographically best fitness, 'hypervolume' the hypervolume of "
+                             "the first front")
+    parser.add_argument('--stagnationTolerance', type=float, default=0.0, required=False,
+                        help="Relative change below which the stagnation metric does not count as improved")
+    parser.add_argument('--timeBudget', type=float, default=0, required=False,
+                        help="Stop after the generation that exceeds this many seconds (0 disables it)")
+    parser.add_argument('--evalBudget', type=int, default=0, required=False,
+                        help="Stop after the generation that reaches this many fitness evaluations "
+                             "(0 disables it)")
+    parser.add_argument('--islands', type=int, default=1, required=False,
+                        help="Number of sub-populations evolved in their own processes (island model), "
+                             "each one of popSize individuals; 1 runs a single population")
+    parser.add_argument('--migrationInterval', type=int, default=10, required=False,
+                        help="Generations between the migrations of the island model")
+    parser.add_argument('--migrants', type=int, default=2, required=False,
+                        help="Non-dominated individuals each island sends to the next one at a migration")
+    parser.add_argument('--checkpointEvery', type=int, default=0, required=False,
+                        help="Write a checkpoint every this many generations (0 disables it)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue from the checkpoint of a run with the same parameters, if there is one")
 
 
     args = parser.parse_args()
 
-    nsgaObj = nsgaAlgo()
+    nsgaObj = nsgaAlgo(args.instance_name, args.distanceMode, args.distanceCacheRows)
 
-    nsgaObj.json_instance = load_instance(args.instance_name)
     nsgaObj.pop_size = args.popSize
     nsgaObj.cross_prob = args.crossProb
     nsgaObj.mut_prob = args.mutProb
     nsgaObj.num_gen = args.numGen
+    nsgaObj.batch_eval = args.batchEval
+    nsgaObj.incremental_eval = args.incrementalEval
+    nsgaObj.engine = args.engine
+    nsgaObj.decoder = args.decoder
+    nsgaObj.cache_size = args.cacheSize
+    nsgaObj.dedup = args.dedup
+    nsgaObj.seeding = tuple(args.seeding)
+    nsgaObj.seed_ratio = args.seedRatio
+    nsgaObj.stagnation_window = args.stagnationWindow
+    nsgaObj.stagnation_metric = args.stagnationMetric
+    nsgaObj.stagnation_tolerance = args.stagnationTolerance
+    nsgaObj.time_budget = args.timeBudget
+    nsgaObj.eval_budget = args.evalBudget
+    nsgaObj.checkpoint_every = args.checkpointEvery
+    nsgaObj.resume = args.resume
+    nsgaObj.workers = args.workers
 
 
-    nsgaObj.runMain()
+    if args.islands > 1:
+        routes, fitness = runIslands(nsgaObj, args.islands, args.migrationInterval, args.migrants)
+        print(f"Merged Pareto front of the {args.islands} islands: {len(routes)} routes "
+              f"(stop: {nsgaObj.stop_reason or 'max_generations'})")
+        for values in fitness.tolist():
+            print(f"  {values}")
+        csv_path = exportFront(f"{nsgaObj.resultsName()}_islands{args.islands}_front.csv", routes, fitness)
+        print(f"Front written to {csv_path}")
+    else:
+        nsgaObj.runMain()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,60 @@
+import random
+
+import numpy
+
+from nsga.NSGA2 import (nsgaAlgo, load_instance, eval_indvidual_fitness, eval_split_state,
+                        eval_incremental_fitness, mutationShuffle, mutationShuffleChanges)
+
+
+def test_incremental_fitness_is_bit_equal_to_full_evaluation():
+    instance = load_instance('./data/json/Input_Data.json')
+    size = instance['Number_of_customers']
+    random.seed(5)
+    for _ in range(100):
+        parent = random.sample(range(1, size + 1), size)
+        fitness, state = eval_split_state(parent, instance, 1)
+        assert fitness == eval_indvidual_fitness(parent, instance, 1)
+        # A chain of mutated children, each evaluated from its parent's state
+        for _ in range(5):
+            child = list(parent)
+            changed_positions = mutationShuffleChanges(child, random.choice([0.01, 0.05, 0.2]))
+            assert changed_positions == [position for position in range(size)
+                                         if child[position] != parent[position]]
+            fitness, child_state = eval_incremental_fitness(child, instance, 1, state, changed_positions)
+            full_fitness, full_state = eval_split_state(child, instance, 1)
+            assert fitness == full_fitness == eval_indvidual_fitness(child, instance, 1)
+            for values, full_values in zip(child_state, full_state):
+                assert numpy.array_equal(values, full_values)
+            parent, state = child, child_state
+
+
+def test_mutation_changes_draw_like_mutation_shuffle():
+    route = list(range(1, 101))
+    random.seed(3)
+    expected = mutationShuffle(list(route), 0.05)[0]
+    random.seed(3)
+    mutated = list(route)
+    mutationShuffleChanges(mutated, 0.05)
+    assert mutated == expected
+
+
+def test_incremental_eval_keeps_the_trajectory():
+    # The flag only changes how the fitness is computed, not the run
+    logbooks = []
+    for incremental_eval in (False, True):
+        random.seed(7)
+        numpy.random.seed(7)
+        nsgaObj = nsgaAlgo()
+        nsgaObj.pop_size = 40
+        nsgaObj.num_gen = 15
+        nsgaObj.incremental_eval = incremental_eval
+        nsgaObj.registerOperators()
+        nsgaObj.generatingPopFitness()
+        nsgaObj.runGenerations()
+        logbooks.append([(record['evals'], record['min'].tolist(), record['avg'].tolist())
+                         for record in nsgaObj.logbook])
+        if incremental_eval:
+            # The clones share the split state of the individual they copy
+            ind = nsgaObj.pop[0]
+            assert nsgaObj.toolbox.clone(ind).split_state is ind.split_state
+    assert logbooks[0] == logbooks[1]
@@ -0,0 +1,26 @@
+import os
+
+import numpy
+
+import nsga.NSGA2
+from nsga.NSGA2 import nsgaAlgo
+from nsga.results import loadResults, readCsvResults
+
+
+def test_export_without_writer_keeps_every_generation(tmp_path, monkeypatch):
+    # The generations without a ResultsWriter only live in the logbook, the
+    # history limit must not drop them
+    monkeypatch.setattr(nsga.NSGA2, 'BASE_DIR', str(tmp_path))
+    os.mkdir(tmp_path / 'results')
+    nsgaObj = nsgaAlgo()
+    nsgaObj.pop_size = 8
+    nsgaObj.num_gen = 150
+    nsgaObj.registerOperators()
+    nsgaObj.generatingPopFitness()
+    nsgaObj.runGenerations()
+    nsgaObj.doExport()
+
+    assert nsgaObj.results_writer is None
+    csv_path = tmp_path / 'results' / f"{nsgaObj.resultsName()}.csv"
+    for arrays in (readCsvResults(str(csv_path)), loadResults(str(csv_path.with_suffix('.npz')))):
+        assert numpy.array_equal(arrays['Generation'], numpy.arange(151))
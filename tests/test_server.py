@@ -0,0 +1,57 @@
+import json
+import asyncio
+
+import pytest
+
+from nsga.server import JobServer, validateConfig
+
+
+@pytest.mark.parametrize('config, message', [
+    ({'options': {'engine': 'bogus'}}, "options.engine must be one of"),
+    ({'options': {'decoder': 'optimal'}}, "options.decoder must be one of"),
+    ({'pop': 'x'}, "pop must be a positive multiple of 4"),
+    ({'gen': -1}, "gen must be a non-negative integer"),
+    ({'cross': 1.5}, "cross must be a number from 0 to 1"),
+    ({'options': {'cache_size': True}}, "options.cache_size must be a non-negative integer"),
+    ({'options': {'dedup': 'all'}}, "options.dedup must be one of"),
+])
+def test_validate_config_rejects_invalid_values(config, message):
+    with pytest.raises(ValueError, match=message):
+        validateConfig(config)
+
+
+def test_validate_config_accepts_valid_values():
+    validateConfig({'pop': 40, 'cross': 0.85, 'mut': 0.02, 'gen': 0, 'seed': 3,
+                    'options': {'engine': 'array', 'decoder': 'fleet', 'seeding': ['nn'], 'time_budget': 1.5}})
+
+
+class _Writer(object):
+    # Collects the lines the server sends to a connection
+    def __init__(self):
+        self.lines = []
+
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        self.lines.append(json.loads(data))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_invalid_submission_gets_an_error_reply():
+    async def submit(request):
+        reader = asyncio.StreamReader()
+        reader.feed_data((json.dumps(request) + '\n').encode())
+        reader.feed_eof()
+        writer = _Writer()
+        await JobServer().handleClient(reader, writer)
+        return writer.lines
+
+    for config in ({'options': {'engine': 'bogus'}}, {'unknown': 1}):
+        lines = asyncio.run(submit({'type': 'submit', 'instance': './data/json/Input_Data.json', 'config': config}))
+        assert len(lines) == 1 and lines[0]['type'] == 'error'
@@ -0,0 +1,36 @@
+import os
+
+import numpy
+import pytest
+
+from nsga.NSGA2 import load_instance
+from nsga.utils import convertTextDirectory
+
+
+def test_files_declaring_the_same_instance_are_named_after_the_text_file(tmp_path):
+    # Both text files declare the instance name Input_Data
+    written = convertTextDirectory('./data/text', str(tmp_path / 'binary'), str(tmp_path / 'json'), workers=2)
+    assert sorted(os.path.basename(path) for path in written) == \
+        ['Input_Data1.json', 'Input_Data1.npz', 'Input_Data2.json', 'Input_Data2.npz']
+    for stem in ('Input_Data1', 'Input_Data2'):
+        from_json = load_instance(str(tmp_path / 'json' / f'{stem}.json'))
+        from_binary = load_instance(str(tmp_path / 'binary' / f'{stem}.npz'))
+        assert from_json['Number_of_customers'] == from_binary['Number_of_customers']
+        assert numpy.array_equal(from_json.demand, from_binary.demand)
+    assert load_instance(str(tmp_path / 'json' / 'Input_Data1.json'))['Number_of_customers'] != \
+        load_instance(str(tmp_path / 'json' / 'Input_Data2.json'))['Number_of_customers']
+
+
+def test_output_names_still_repeated_are_rejected(tmp_path):
+    # second.txt and third.txt declare Input_Data, so they are named after
+    # their stems, but first.txt declares the instance second
+    text_dir = tmp_path / 'text'
+    text_dir.mkdir()
+    with open('./data/text/Input_Data1.txt') as file_object:
+        lines = file_object.readlines()
+    for stem, instance_name in (('first', 'second'), ('second', 'Input_Data'), ('third', 'Input_Data')):
+        with open(text_dir / f'{stem}.txt', 'w') as file_object:
+            file_object.writelines([f'{instance_name}\n'] + lines[1:])
+    with pytest.raises(ValueError, match="same output names"):
+        convertTextDirectory(str(text_dir), json_dir=str(tmp_path / 'json'), workers=1)
+    assert not (tmp_path / 'json').exists()